@@ -4,111 +4,608 @@
 One-shot difficulty-balanced sampler (auto element_count, dataset-wise params)
 """
 
-import json, random, argparse
+import json, os, random, re, argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 import numpy as np
+from PIL import Image
+
+
+SWAP_CHUNK = 4096          # candidate values scored per broadcast block
+META_INDEX = ".gt_meta.json"
+IMAGE_META_INDEX = ".img_meta.json"
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp")
+META_VERSION = 1
+SWAP_PAIRS = 1 << 20       # (out, in) pairs scored per block in the multi-feature search
+TOKEN_PAT = re.compile(r"\w+")
 
 
 # =========================================================
-def balanced_sample(
+def gt_features(data, key: str = "element_count") -> Dict[str, float]:
+    """Difficulty features of one parsed GT JSON (list of labels or dict)."""
+    if isinstance(data, list):
+        items, feats = data, {}
+    elif isinstance(data, dict):
+        items = data.get("elements", [])
+        # Numeric top-level fields stay usable as `key`, as before.
+        feats = {k: v for k, v in data.items()
+                 if isinstance(v, (int, float)) and not isinstance(v, bool)}
+    else:
+        raise ValueError("Unsupported JSON structure")
+
+    labels = [str(o.get("label", "")) for o in items if isinstance(o, dict)]
+    tokens = TOKEN_PAT.findall(" ".join(labels).lower())
+    feats.setdefault("element_count", len(items))
+    feats.setdefault(key, len(items))
+    feats.update({
+        "label_chars":      sum(len(l) for l in labels),
+        "mean_label_chars": sum(len(l) for l in labels) / max(len(labels), 1),
+        "token_count":      len(tokens),
+        "vocab_size":       len(set(tokens)),
+    })
+    return feats
+
+
+def _parse_gt(path: str, key: str) -> Dict[str, float]:
+    with open(path, "r", encoding="utf-8") as f:
+        return gt_features(json.load(f), key)
+
+
+def _refresh_index(
+    folder: Path,
+    index_path: Path,
+    suffixes: Tuple[str, ...],
+    parse,
+    tag: str,
+    workers: int,
+) -> Dict[str, Dict]:
+    """
+    Features of every file in folder with one of `suffixes`, cached in a
+    sidecar JSON keyed by file name and invalidated by mtime/size; only new
+    or changed files are handed to `parse`, by a thread pool.
+    """
+    index: Dict = {}
+    if index_path.exists():
+        try:
+            index = json.loads(index_path.read_text("utf-8"))
+        except ValueError:
+            index = {}
+    if index.get("version") != META_VERSION or index.get("key") != tag:
+        index = {"version": META_VERSION, "key": tag, "files": {}}
+    cached = index["files"]
+
+    current: Dict[str, Tuple[int, int, str]] = {}
+    with os.scandir(folder) as it:
+        for entry in it:
+            # Dot-files are skipped: the sidecars (ours or another index's) live here too.
+            if (entry.name.lower().endswith(suffixes) and not entry.name.startswith(".")
+                    and entry.is_file()):
+                st = entry.stat()
+                current[entry.name] = (st.st_mtime_ns, st.st_size, entry.path)
+
+    stale = [name for name, (mtime, size, _) in current.items()
+             if name not in cached or cached[name]["mtime_ns"] != mtime or cached[name]["size"] != size]
+    dirty = bool(stale) or any(name not in current for name in cached)
+
+    if stale:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            parsed = pool.map(lambda name: parse(current[name][2]), stale)
+            for name, feats in zip(stale, parsed):
+                cached[name] = {"mtime_ns": current[name][0], "size": current[name][1], "features": feats}
+    for name in [n for n in cached if n not in current]:
+        del cached[name]
+
+    if dirty:
+        tmp_path = index_path.with_name(index_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(index, ensure_ascii=False), "utf-8")
+        os.replace(tmp_path, index_path)
+
+    return {name: cached[name]["features"] for name in current}
+
+
+def load_gt_metadata(
     folder: Path,
-    n: int,
     key: str = "element_count",
-    default_bins: int = 5,
-    seed: int = 42,
-) -> List[str]:
+    index_path: Optional[Path] = None,
+    workers: int = 8,
+) -> pd.DataFrame:
     """
-    Parameters
-    ----------
-    folder : Path          dataset directory containing 60 json files
-    n      : int           how many samples to draw  (5–20, divides 60)
-    key    : str           column name for difficulty score
-    default_bins : int     default quantile bins for stratification
-    seed   : int           random seed for reproducibility
+    Feature table of every GT JSON in folder, one row per file (sorted by name).
+
+    Features are cached in a sidecar index (default: <folder>/.gt_meta.json)
+    keyed by file name and invalidated by mtime/size; only new or changed
+    files are parsed, by a thread pool.
+    """
+    feats = _refresh_index(folder, index_path or folder / META_INDEX, (".json",),
+                           lambda path: _parse_gt(path, key), key, workers)
+    names = sorted(feats)
+    df = pd.DataFrame([feats[name] for name in names])
+    df["__file"] = names
+    return df
+
+
+def image_features(path: str, ink_level: int = 245, max_edge: int = 512) -> Dict[str, float]:
+    """Pixel size and ink density (share of non-background pixels) of one image."""
+    with Image.open(path) as im:
+        width, height = im.size
+        if im.mode in ("RGBA", "LA", "P"):
+            # Transparent background counts as white paper.
+            rgba = im.convert("RGBA")
+            im = Image.alpha_composite(Image.new("RGBA", rgba.size, (255, 255, 255, 255)), rgba)
+        gray = im.convert("L")
+        gray.thumbnail((max_edge, max_edge))
+        density = float((np.asarray(gray) < ink_level).mean())
+    return {
+        "img_width":   width,
+        "img_height":  height,
+        "img_pixels":  width * height,
+        "ink_density": density,
+    }
+
+
+def load_image_metadata(image_dir: Path, workers: int = 8) -> pd.DataFrame:
+    """
+    Image features keyed by the number in the file name (Benchmark/12.png
+    belongs to *_12.json), cached in <image_dir>/.img_meta.json.
+    """
+    feats = _refresh_index(image_dir, image_dir / IMAGE_META_INDEX, IMAGE_SUFFIXES,
+                           image_features, "image", workers)
+    rows = []
+    for name, f in feats.items():
+        stem = Path(name).stem
+        if stem.isdigit():
+            rows.append({"__num": int(stem), **f})
+    return pd.DataFrame(rows).drop_duplicates("__num") if rows else pd.DataFrame(columns=["__num"])
+
+
+def load_feature_table(
+    folder: Path,
+    features: List[str],
+    image_dir: Optional[Path] = None,
+    index_path: Optional[Path] = None,
+) -> pd.DataFrame:
+    """GT metadata joined with image features; missing image values take the column median."""
+    # Always the default tag, so the sidecar is shared with balanced_sample and
+    # does not depend on the order of `features`.
+    df = load_gt_metadata(folder, "element_count", index_path)
+    if image_dir is not None:
+        images = load_image_metadata(image_dir)
+        clash = sorted((set(images.columns) & set(df.columns)) - {"__num"})
+        if clash:
+            raise ValueError(f"GT and image features share column name(s) {clash}")
+        df["__num"] = df["__file"].str.extract(r"_(\d+)\.json$", expand=False).astype(float)
+        df = df.merge(images, on="__num", how="left").drop(columns="__num")
+    missing = [f for f in features if f not in df]
+    if missing:
+        raise KeyError(f"Unknown feature(s) {missing}; available: {sorted(c for c in df if c != '__file')}")
+    df[features] = df[features].astype(np.float64).fillna(df[features].median())
+    return df
+
+
+def feature_matrix(df: pd.DataFrame, features: List[str]) -> np.ndarray:
+    """Standardized log1p(features), so counts and densities weigh alike."""
+    X = np.log1p(np.maximum(df[features].to_numpy(np.float64), 0.0))
+    std = X.std(axis=0)
+    return (X - X.mean(axis=0)) / np.where(std > 0, std, 1.0)
+
+
+def subset_J(s, q, k: int, mu: float, sigma: float, lam: float):
+    """
+    J = |mean - mu| + lam * |std - sigma| of a k-element subset, given its
+    running sum s and sum of squares q (scalars or broadcastable arrays).
+    """
+    mean = s / k
+    std  = np.sqrt(np.maximum(q / k - mean * mean, 0.0))
+    return np.abs(mean - mu) + lam * np.abs(std - sigma)
+
+
+def optimize_subset(
+    values: np.ndarray,
+    chosen: np.ndarray,
+    mu: float,
+    sigma: float,
+    lam: float,
+    eps: float,
+    max_iter: int = 10_000,
+) -> Tuple[np.ndarray, float]:
+    """
+    Best-swap local search: every round scores all (out, in) swaps from the
+    running sum / sum of squares and applies the best one, until J <= eps or
+    no swap improves J.
+
+    Items with equal values are interchangeable for J, so only distinct
+    values are scored, which keeps a round cheap even for 100k+ files.
+    """
+    chosen = np.array(chosen, dtype=np.int64)
+    k = len(chosen)
+    in_subset = np.zeros(len(values), dtype=bool)
+    in_subset[chosen] = True
+
+    s = float(values[chosen].sum())
+    q = float(np.square(values[chosen]).sum())
+    j = float(subset_J(s, q, k, mu, sigma, lam))
+
+    for _ in range(max_iter):
+        if j <= eps:
+            break
+        rest = np.flatnonzero(~in_subset)
+        if rest.size == 0:
+            break
+        out_vals, out_pos = np.unique(values[chosen], return_index=True)
+        in_vals, in_pos   = np.unique(values[rest], return_index=True)
+
+        best_j, best = j, None
+        for start in range(0, in_vals.size, SWAP_CHUNK):
+            iv = in_vals[start:start + SWAP_CHUNK]
+            js = subset_J(s - out_vals[:, None] + iv[None, :],
+                          q - np.square(out_vals)[:, None] + np.square(iv)[None, :],
+                          k, mu, sigma, lam)
+            flat = int(js.argmin())
+            if js.flat[flat] < best_j - 1e-12:
+                best_j = float(js.flat[flat])
+                best = (flat // iv.size, start + flat % iv.size)
+        if best is None:
+            break
+
+        o, i = best
+        out_idx, in_idx = chosen[out_pos[o]], rest[in_pos[i]]
+        chosen[out_pos[o]] = in_idx
+        in_subset[out_idx], in_subset[in_idx] = False, True
+        s += values[in_idx] - values[out_idx]
+        q += values[in_idx] ** 2 - values[out_idx] ** 2
+        j = float(subset_J(s, q, k, mu, sigma, lam))
+
+    return chosen, j
+
+
+def moment_J(S, Q, k: int, mu: np.ndarray, cov: np.ndarray, lam: float):
+    """
+    ||mean - mu||^2 + lam * ||cov - Cov||_F^2 of a k-row subset of standardized
+    features, from its running sum S (..., d) and sum of outer products Q (..., d, d).
+    """
+    mean = S / k
+    C = Q / k - mean[..., :, None] * mean[..., None, :]
+    return np.square(mean - mu).sum(-1) + lam * np.square(C - cov).sum((-2, -1))
+
+
+def _swap_moment_J(Y: np.ndarray, Xi: np.ndarray, k: int, g: np.ndarray, D: np.ndarray,
+                   lam: float) -> np.ndarray:
+    """
+    moment_J after swapping out rows Y for rows Xi (both centred on the
+    subset mean), for every (out, in) pair. With g = mean - mu and
+    D = cov_subset - Cov, the swap changes the mean by (x - y)/k and the
+    covariance by (xx' - yy')/k - zz'/k^2 (z = x - y), so J expands into dot
+    products only: O(1) per pair, no d x d temporaries.
+    """
+    yy = np.einsum("od,od->o", Y, Y)[:, None]
+    xx = np.einsum("id,id->i", Xi, Xi)[None, :]
+    xy = Y @ Xi.T
+    YD = Y @ D
+    yDy = np.einsum("od,od->o", YD, Y)[:, None]
+    xDx = np.einsum("id,id->i", Xi @ D, Xi)[None, :]
+    yDx = YD @ Xi.T
+
+    zz  = xx + yy - 2 * xy
+    zDz = xDx + yDy - 2 * yDx
+    mean_term = g @ g + 2 * ((Xi @ g)[None, :] - (Y @ g)[:, None]) / k + zz / k**2
+    cross = (xDx - yDy) / k - zDz / k**2
+    sq = ((xx**2 + yy**2 - 2 * xy**2) / k**2 + zz**2 / k**4
+          - 2 * ((xx - xy)**2 - (xy - yy)**2) / k**3)
+    return mean_term + lam * (np.square(D).sum() + 2 * cross + sq)
+
+
+def optimize_subset_multi(
+    X: np.ndarray,
+    chosen: np.ndarray,
+    lam: float = 1.0,
+    eps: float = 0.0,
+    max_iter: int = 10_000,
+) -> Tuple[np.ndarray, float]:
     """
-    rng = random.Random(seed)
+    Best-swap local search matching the subset's mean and covariance to the
+    population's. From the running sums every swap is scored in O(1)
+    (see _swap_moment_J); all swaps of a round are scored in blocks.
+    """
+    mu, cov = X.mean(axis=0), np.cov(X, rowvar=False, bias=True).reshape(X.shape[1], X.shape[1])
+    chosen = np.array(chosen, dtype=np.int64)
+    k = len(chosen)
+    in_subset = np.zeros(len(X), dtype=bool)
+    in_subset[chosen] = True
+
+    S = X[chosen].sum(axis=0)
+    Q = X[chosen].T @ X[chosen]
+    j = float(moment_J(S, Q, k, mu, cov, lam))
+    block = max(1, SWAP_PAIRS // k)
+
+    for _ in range(max_iter):
+        if j <= eps:
+            break
+        rest = np.flatnonzero(~in_subset)
+        if rest.size == 0:
+            break
+        mean = S / k
+        D = Q / k - np.outer(mean, mean) - cov
+        Y = X[chosen] - mean
+
+        best_j, best = j, None
+        for start in range(0, rest.size, block):
+            js = _swap_moment_J(Y, X[rest[start:start + block]] - mean, k, mean - mu, D, lam)
+            flat = int(js.argmin())
+            if js.flat[flat] < best_j - 1e-12:
+                best_j = float(js.flat[flat])
+                best = divmod(flat, js.shape[1])
+                best = (best[0], start + best[1])
+        if best is None:
+            break
+
+        o, i = best
+        out_idx, in_idx = chosen[o], rest[i]
+        chosen[o] = in_idx
+        in_subset[out_idx], in_subset[in_idx] = False, True
+        S = S + X[in_idx] - X[out_idx]
+        Q = Q + np.outer(X[in_idx], X[in_idx]) - np.outer(X[out_idx], X[out_idx])
+        j = float(moment_J(S, Q, k, mu, cov, lam))
+
+    return chosen, j
 
-    records = []
-    for fp in folder.glob("*.json"):
-        with open(fp, "r", encoding="utf-8") as f:
-            data = json.load(f)
 
-        if isinstance(data, list):
-            elem_cnt = len(data)
-            meta = {key: elem_cnt}
-        elif isinstance(data, dict):
-            meta = data
-            if key not in meta:
-                meta[key] = len(meta.get("elements", []))
-        else:
-            raise ValueError(f"Unsupported JSON structure in {fp}")
+def joint_quantile_cells(X: np.ndarray, bins: int) -> np.ndarray:
+    """Cell id per row from per-feature quantile bins (ties broken by order)."""
+    codes = np.zeros(len(X), dtype=np.int64)
+    for col in X.T:
+        ranks = pd.Series(col).rank(method="first")
+        codes = codes * bins + pd.qcut(ranks, q=bins, labels=False).to_numpy()
+    return np.unique(codes, return_inverse=True)[1]
 
-        meta["__file"] = fp.name
-        records.append(meta)
 
-    df = pd.DataFrame(records)
-    assert len(df) >= n, "n larger than dataset!"
+def kmeans_cells(X: np.ndarray, k: int, seed: int = 0, iters: int = 50) -> np.ndarray:
+    """Plain Lloyd k-means with k-means++ seeding; returns the cell id per row."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(X))
+    centers = X[[rng.integers(len(X))]]
+    d2 = np.square(X - centers[0]).sum(axis=1)
+    for _ in range(1, k):
+        probs = d2 / d2.sum() if d2.sum() > 0 else None
+        centers = np.vstack([centers, X[rng.choice(len(X), p=probs)]])
+        d2 = np.minimum(d2, np.square(X - centers[-1]).sum(axis=1))
+
+    labels = np.zeros(len(X), dtype=np.int64)
+    for it in range(iters):
+        dist = np.square(X[:, None, :] - centers[None, :, :]).sum(axis=2)
+        new_labels = dist.argmin(axis=1)
+        if it and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(k):
+            members = X[labels == c]
+            if len(members):
+                centers[c] = members.mean(axis=0)
+    return np.unique(labels, return_inverse=True)[1]
+
+
+def allocate_cells(cells: np.ndarray, n: int) -> np.ndarray:
+    """Proportional allocation of n draws over cells (largest remainder, capped by cell size)."""
+    sizes = np.bincount(cells)
+    quota = sizes * n / sizes.sum()
+    take = np.minimum(np.floor(quota).astype(np.int64), sizes)
+    for c in np.argsort(-(quota - take), kind="stable"):
+        if take.sum() >= n:
+            break
+        if take[c] < sizes[c]:
+            take[c] += 1
+    return take
 
 
+def _draw_multi(X: np.ndarray, cells: np.ndarray, n: int, rng: random.Random,
+                restarts: int, lam: float, eps: float) -> Tuple[np.ndarray, float]:
+
+    take = allocate_cells(cells, n)
+    members = [np.flatnonzero(cells == c).tolist() for c in range(len(take))]
+
+    best_chosen, best_j = None, np.inf
+    for _ in range(max(1, restarts)):
+        chosen = []
+        for c, idx in enumerate(members):
+            idx = list(idx)
+            rng.shuffle(idx)
+            chosen.extend(idx[:take[c]])
+
+        chosen, j = optimize_subset_multi(X, np.array(chosen), lam, eps)
+        if j < best_j:
+            best_chosen, best_j = chosen, j
+        if best_j <= eps:
+            break
+    return best_chosen, best_j
+
+
+def _population_params(df: pd.DataFrame, key: str, folder: Path, default_bins: int) -> Dict[str, float]:
+
     name_lower = str(folder).lower()
     is_ti2i = "ti2i" in name_lower          
     kappa   = 1.8  if is_ti2i else 1.0      # λ 
     eps_k   = 0.05 if is_ti2i else 0.10     # ε
     bins0   = 7    if is_ti2i else default_bins
 
-
     mu_pop    = df[key].mean()
     sigma_pop = df[key].std(ddof=0)
-    lam = kappa * sigma_pop / (mu_pop + 1e-6)          
-    eps = eps_k * sigma_pop * (20 / n)                
+    return {
+        "mu":    float(mu_pop),
+        "sigma": float(sigma_pop),
+        "lam":   float(kappa * sigma_pop / (mu_pop + 1e-6)),
+        "eps_k": eps_k,
+        "bins0": bins0,
+    }
+
 
- 
-    df["bin"] = pd.qcut(df[key], q=bins0,
-                        labels=False, duplicates="drop")
-    actual_bins = len(df["bin"].unique())
+def _strata(df: pd.DataFrame, key: str, bins0: int, n: int,
+            cache: Dict[int, np.ndarray]) -> List[List[int]]:
+
+    # qcut results are shared by every draw that ends up with the same bin count.
+    def qcut(q: int) -> np.ndarray:
+        if q not in cache:
+            cache[q] = pd.qcut(df[key], q=q, labels=False, duplicates="drop").to_numpy()
+        return cache[q]
+
+    actual_bins = len(np.unique(qcut(bins0)))
     n_bins = min(bins0, n, actual_bins)               
-    if n_bins != bins0:
-        df["bin"] = pd.qcut(df[key], q=n_bins,
-                            labels=False, duplicates="drop")
+    bins = qcut(n_bins)
+    return [np.flatnonzero(bins == b).tolist() for b in range(n_bins)]
+
+
+def _draw(values: np.ndarray, bin_idx: List[List[int]], n: int, rng: random.Random,
+          restarts: int, params: Dict[str, float], eps: float) -> Tuple[np.ndarray, float]:
 
+    n_bins  = len(bin_idx)
     per_bin = max(1, n // n_bins)                     
     rem     = n % n_bins
-    chosen  = []
-
-    for b in range(n_bins):
-        idx = df.index[df["bin"] == b].tolist()
-        rng.shuffle(idx)
-        take = per_bin + (1 if b < rem else 0)
-        chosen.extend(idx[:take])
-
-    sub = df.loc[chosen]
-    not_chosen = list(set(df.index) - set(chosen))
-
-    def J(sdf: pd.DataFrame) -> float:
-        return abs(sdf[key].mean() - mu_pop) + \
-               lam * abs(sdf[key].std(ddof=0) - sigma_pop)
-
-    for _ in range(3):                               
-        improved = False
-        while J(sub) > eps and not_chosen:
-            out_idx = rng.choice(sub.index.tolist())
-            in_idx  = rng.choice(not_chosen)
-            new_sub = pd.concat([sub.drop(out_idx), df.loc[[in_idx]]])
-
-            if J(new_sub) < J(sub):
-                sub = new_sub
-                not_chosen.remove(in_idx)
-                not_chosen.append(out_idx)
-                improved = True
-            else:
-                break
-        if not improved:
+
+    best_chosen, best_j = None, np.inf
+    for _ in range(max(1, restarts)):
+        chosen = []
+        for b, idx in enumerate(bin_idx):
+            idx = list(idx)
+            rng.shuffle(idx)
+            take = per_bin + (1 if b < rem else 0)
+            chosen.extend(idx[:take])
+
+        chosen, j = optimize_subset(values, np.array(chosen), params["mu"], params["sigma"],
+                                    params["lam"], eps)
+        if j < best_j:
+            best_chosen, best_j = chosen, j
+        if best_j <= eps:
             break
+    return best_chosen, best_j
+
+
+def balanced_sample_many(
+    folder: Path,
+    ns: List[int],
+    seeds: List[int],
+    key: str = "element_count",
+    default_bins: int = 5,
+    restarts: int = 4,
+    index_path: Optional[Path] = None,
+) -> List[Dict]:
+    """
+    Draw one balanced split per (n, seed) pair from a single load of folder.
+
+    Metadata, population statistics and quantile bins are computed once and
+    shared; each split records its J next to the picked files.
+    """
+    df = load_gt_metadata(folder, key, index_path)
+    assert len(df) >= max(ns), "n larger than dataset!"
+
+    params = _population_params(df, key, folder, default_bins)
+    values = df[key].to_numpy(dtype=np.float64)
+    files  = df["__file"].to_numpy()
+    qcuts: Dict[int, np.ndarray] = {}
+
+    splits = []
+    for n in ns:
+        bin_idx = _strata(df, key, params["bins0"], n, qcuts)
+        eps = params["eps_k"] * params["sigma"] * (20 / n)                
+        for seed in seeds:
+            chosen, j = _draw(values, bin_idx, n, random.Random(seed), restarts, params, eps)
+            splits.append({
+                "folder": folder.name,
+                "n":      n,
+                "seed":   seed,
+                "J":      round(float(j), 6),
+                "eps":    round(float(eps), 6),
+                "files":  files[chosen].tolist(),
+            })
+    return splits
+
+
+DEFAULT_FEATURES = ["element_count", "mean_label_chars", "vocab_size"]
+
+
+def stratified_sample_many(
+    folder: Path,
+    ns: List[int],
+    seeds: List[int],
+    features: List[str] = DEFAULT_FEATURES,
+    image_dir: Optional[Path] = None,
+    strata: str = "quantile",
+    bins: int = 3,
+    lam: float = 1.0,
+    restarts: int = 4,
+    index_path: Optional[Path] = None,
+) -> List[Dict]:
+    """
+    Multi-feature version of balanced_sample_many.
+
+    Rows are stratified on a difficulty vector (GT features plus, with
+    image_dir, Benchmark image size and ink density) by joint quantile bins
+    ("quantile", `bins` per feature) or k-means cells ("kmeans", `bins` x
+    #features cells), then swapped until the split matches the population
+    mean and covariance of the standardized features.
+    """
+    if strata not in ("quantile", "kmeans"):
+        raise ValueError(f"Unknown strata: {strata}")
+    df = load_feature_table(folder, features, image_dir, index_path)
+    assert len(df) >= max(ns), "n larger than dataset!"
+
+    X = feature_matrix(df, features)
+    files = df["__file"].to_numpy()
+    if strata == "quantile":
+        cells = joint_quantile_cells(X, bins)
+    else:
+        cells = kmeans_cells(X, bins * len(features), seed=0)
 
-    return sub["__file"].tolist()
+    splits = []
+    for n in ns:
+        for seed in seeds:
+            chosen, j = _draw_multi(X, cells, n, random.Random(seed), restarts, lam, 0.0)
+            splits.append({
+                "folder":   folder.name,
+                "n":        n,
+                "seed":     seed,
+                "J":        round(float(j), 6),
+                "features": list(features),
+                "strata":   strata,
+                "files":    files[chosen].tolist(),
+            })
+    return splits
+
+
+def write_split_manifest(splits: List[Dict], out_path: Path) -> Path:
+    """One manifest for many splits: JSON, or long-format Parquet (one row per file)."""
+    if out_path.suffix.lower() == ".parquet":
+        rows = [{"split": i, **{k: (",".join(v) if isinstance(v, list) else v)
+                                for k, v in sp.items() if k != "files"}, "file": f}
+                for i, sp in enumerate(splits) for f in sp["files"]]
+        pd.DataFrame(rows).to_parquet(out_path, index=False)
+    else:
+        out_path.write_text(json.dumps(splits, indent=2, ensure_ascii=False), "utf-8")
+    return out_path
+
+
+def balanced_sample(
+    folder: Path,
+    n: int,
+    key: str = "element_count",
+    default_bins: int = 5,
+    seed: int = 42,
+    restarts: int = 4,
+    index_path: Optional[Path] = None,
+) -> List[str]:
+    """
+    Parameters
+    ----------
+    folder : Path          dataset directory containing 60 json files
+    n      : int           how many samples to draw  (5–20, divides 60)
+    key    : str           column name for difficulty score
+    default_bins : int     default quantile bins for stratification
+    seed   : int           random seed for reproducibility
+    restarts : int         stratified starts for the swap search; the best is kept
+    index_path : Path      metadata sidecar (default: <folder>/.gt_meta.json)
+    """
+    split, = balanced_sample_many(folder, [n], [seed], key, default_bins, restarts, index_path)
+    return split["files"]
 
 
 
@@ -120,19 +617,56 @@ if __name__ == "__main__":
     parser.add_argument("-n", type=int, default=15,
                         help="samples per draw (5–20)")
     parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--index", type=str, default=None,
+                        help="GT metadata sidecar (default: <folder>/.gt_meta.json)")
     parser.add_argument("--out", type=str, default="picked_list.json")
+    parser.add_argument("--folders", nargs="+", default=None,
+                        help="draw many splits at once from these dataset directories")
+    parser.add_argument("--ns", type=str, default=None, help="comma-separated split sizes (many-split mode)")
+    parser.add_argument("--seeds", type=str, default=None, help="comma-separated seeds (many-split mode)")
+    parser.add_argument("--features", type=str, default=None,
+                        help="comma-separated difficulty features for multi-feature stratification, "
+                             f"e.g. {','.join(DEFAULT_FEATURES)},ink_density")
+    parser.add_argument("--image_dir", type=str, default=None,
+                        help="Benchmark image folder providing img_width/img_height/img_pixels/ink_density")
+    parser.add_argument("--strata", choices=["quantile", "kmeans"], default="quantile")
+    parser.add_argument("--bins", type=int, default=3,
+                        help="quantile bins per feature, or k-means cells per feature")
     args = parser.parse_args()
 
-    picks = balanced_sample(Path(args.folder), n=args.n, seed=args.seed)
-    print(f"Picked {len(picks)} files:\n" + "\n".join(picks))
+    if args.folders or args.ns or args.seeds or args.features:
+        ns    = [int(v) for v in (args.ns or str(args.n)).split(",")]
+        seeds = [int(v) for v in (args.seeds or str(args.seed)).split(",")]
+        index_path = Path(args.index) if args.index else None
+        splits = []
+        for folder in (args.folders or [args.folder]):
+            if args.features:
+                splits.extend(stratified_sample_many(
+                    Path(folder), ns, seeds, [f.strip() for f in args.features.split(",")],
+                    Path(args.image_dir) if args.image_dir else None, args.strata, args.bins,
+                    index_path=index_path))
+            else:
+                splits.extend(balanced_sample_many(Path(folder), ns, seeds, index_path=index_path))
+        for sp in splits:
+            tol = f" (eps {sp['eps']:.4f})" if "eps" in sp else ""
+            print(f"{sp['folder']:<20} n={sp['n']:<3} seed={sp['seed']:<6} J={sp['J']:.4f}{tol}")
+        out_path = Path(args.out if args.out != "picked_list.json" else "splits_manifest.json")
+        write_split_manifest(splits, out_path)
+        print(f"Saved {len(splits)} splits to", out_path)
+    else:
+        picks = balanced_sample(Path(args.folder), n=args.n, seed=args.seed,
+                                index_path=Path(args.index) if args.index else None)
+        print(f"Picked {len(picks)} files:\n" + "\n".join(picks))
 
-    json.dump(picks,
-              open(args.out, "w", encoding="utf-8"),
-              indent=2, ensure_ascii=False)
-    print("Saved list to", args.out)
+        json.dump(picks,
+                  open(args.out, "w", encoding="utf-8"),
+                  indent=2, ensure_ascii=False)
+        print("Saved list to", args.out)
 
 
 
 
 # python balanced_sampler.py --folder GT/prompt-gt-t2i -n 15
-# python balanced_sampler.py --folder GT/prompt-gt-ti2i -n 15
\ No newline at end of file
+# python balanced_sampler.py --folder GT/prompt-gt-ti2i -n 15
+# python balanced_sampler.py --folders GT/prompt-gt-t2i GT/prompt-gt-ti2i --ns 5,10,20 --seeds 0,1,2 --out splits.parquet
+# python balanced_sampler.py --folder GT/prompt-gt-ti2i --ns 10,20 --features element_count,vocab_size,ink_density --image_dir Benchmark --strata kmeans
\ No newline at end of file
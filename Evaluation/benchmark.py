@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline benchmarks for the evaluation pipeline (no API calls)
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import evaluation_code as ec
+from evaluation_code import iter_pdf_labels
+from synth_pdfs import make_tagged_pdf
+
+try:
+    import resource
+except ImportError:                 # Windows
+    resource = None
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+# =========================================================
+def bench_extract(pdf_dir: Path, fallback_words: bool = False, repeat: int = 1) -> Dict:
+    """
+    Time structure-tree label extraction for every PDF in pdf_dir.
+
+    Each file is extracted `repeat` times and the best time is kept, so the
+    numbers track the walker rather than cold-cache disk reads. The parsed
+    document cache is switched off meanwhile, so every repeat still pays
+    for opening and parsing the file.
+    """
+    rows = []
+    cache_mb = ec.DOC_CACHE_MB
+    ec.configure_doc_cache(0)
+    try:
+        for pdf_path in sorted(pdf_dir.glob("*.pdf")):
+            best = float("inf")
+            n_labels = 0
+            try:
+                for _ in range(max(1, repeat)):
+                    t0 = time.perf_counter()
+                    n_labels = sum(1 for _ in iter_pdf_labels(pdf_path, fallback_words))
+                    best = min(best, time.perf_counter() - t0)
+            except Exception as e:
+                rows.append({"file": pdf_path.name, "error": str(e)})
+                continue
+            rows.append({"file": pdf_path.name, "labels": n_labels, "seconds": round(best, 6)})
+    finally:
+        ec.configure_doc_cache(cache_mb)
+
+    times = [r["seconds"] for r in rows if "seconds" in r]
+    total = sum(times)
+    return {
+        "files":         len(times),
+        "errors":        sum(1 for r in rows if "error" in r),
+        "labels":        sum(r.get("labels", 0) for r in rows),
+        "total_seconds": round(total, 6),
+        "files_per_sec": round(len(times) / total, 2) if total else 0.0,
+        "p50_seconds":   round(_percentile(times, 0.50), 6),
+        "p95_seconds":   round(_percentile(times, 0.95), 6),
+        "max_seconds":   round(max(times), 6) if times else 0.0,
+        "details":       rows,
+    }
+
+
+# =========================================================
+DEFAULT_ANSWERS = {
+    "design": "Module 1: The label of Module 1 touches the border of Module 2.\n1",
+    "blank":  "0.10",
+    "labels": '["Input", "Output"]',
+}
+
+def _judge_kind(prompt: str) -> str:
+
+    if "unreasonable aspects" in prompt:
+        return "design"
+    if "blank space" in prompt:
+        return "blank"
+    return "labels"
+
+class StubJudge:
+    """
+    Local stand-in for the Azure chat-completions endpoint.
+
+    Every request waits `latency` seconds plus up to `jitter` seconds derived
+    from the request body, then returns the canned answer of the judge that
+    sent it, so repeated runs see exactly the same delays and scores.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0,
+                 answers: Optional[Dict[str, str]] = None, port: int = 0):
+
+        self.latency = latency
+        self.jitter  = jitter
+        self.answers = {**DEFAULT_ANSWERS, **(answers or {})}
+        self.port    = port
+        self.calls   = 0
+        self.peers   = set()        # client (host, port) pairs, one per TCP connection
+        self._lock   = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def _handler(self):
+
+        judge = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                body = json.loads(raw)
+                content = body["messages"][0]["content"]
+                prompt = content if isinstance(content, str) else content[0]["text"]
+                with judge._lock:
+                    judge.calls += 1
+                    judge.peers.add(self.client_address)
+                spread = int(hashlib.sha256(raw).hexdigest()[:8], 16) / 0xFFFFFFFF
+                time.sleep(judge.latency + judge.jitter * spread)
+
+                out = json.dumps({
+                    "id": f"stub-{judge.calls}", "object": "chat.completion", "created": 0,
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant",
+                                             "content": judge.answers[_judge_kind(prompt)]}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        return Handler
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self) -> "StubJudge":
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="stub-judge", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+
+        self._server.shutdown()
+        self._server.server_close()
+
+def _peak_rss_mb() -> Optional[float]:
+
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _run_case(endpoint: str, pdf_dir: Path, gt_dir: Path, out_dir: Path,
+              workers: int, render_procs: int, verbose: bool) -> Tuple[Path, float, Optional[float]]:
+
+    # Runs in a fresh process per case, so ru_maxrss is this case's peak alone.
+    ec.AZURE_ENDPOINT    = endpoint
+    ec.AZURE_API_KEY     = "stub"
+    ec.AZURE_API_VERSION = "2024-02-01"
+    ec.AZURE_MODEL_NAME  = ec.AZURE_MODEL_NAME or "stub"
+    ec.configure_http_pool(ec.HTTP_POOL_SIZE, ec.HTTP_TIMEOUT, ec.HTTP_CONNECT_TIMEOUT)
+    ec.set_stage_timings(True)
+
+    sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    t0 = time.perf_counter()
+    with sink:
+        summary_path = ec.evaluate_batch(pdf_dir, gt_dir, out_dir, workers=workers,
+                                         resume=False, render_procs=render_procs)
+    return summary_path, time.perf_counter() - t0, _peak_rss_mb()
+
+def bench_pipeline(work_dir: Path,
+                   sizes: List[Tuple[float, float]],
+                   element_counts: List[int],
+                   pdfs_per_case: int = 8,
+                   workers: int = 4,
+                   render_procs: int = 0,
+                   latency: float = 0.5,
+                   jitter: float = 0.0,
+                   answers: Optional[Dict[str, str]] = None,
+                   verbose: bool = False) -> Dict:
+    """
+    Run evaluate_batch end to end against a StubJudge.
+
+    For every page size x element count a set of synthetic tagged PDFs and
+    matching GT files is written under work_dir, evaluated from scratch, and
+    reported as PDFs/sec, per-stage latency (from --timings) and peak RSS.
+    Each case is evaluated in its own spawned process, so the peak RSS
+    belongs to that case rather than to every case run before it.
+    """
+    rows = []
+    ctx = multiprocessing.get_context("spawn")
+    with StubJudge(latency, jitter, answers) as judge:
+        for width, height in sizes:
+            for n_elements in element_counts:
+                case_dir = work_dir / f"{int(width)}x{int(height)}_{n_elements}"
+                pdf_dir, gt_dir = case_dir / "pdfs", case_dir / "gt"
+                ec.ensure_out_dir(pdf_dir)
+                ec.ensure_out_dir(gt_dir)
+                for n in range(1, pdfs_per_case + 1):
+                    labels = [f"node {n}.{j}" for j in range(n_elements)]
+                    (gt_dir / f"t2i_{n}.json").write_text(
+                        json.dumps([{"label": l} for l in labels], ensure_ascii=False), "utf-8")
+                    make_tagged_pdf(pdf_dir / f"t2i_{n}_bench_step_10.pdf", labels, (width, height))
+
+                calls_before = judge.calls
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    summary_path, elapsed, peak_rss = pool.submit(
+                        _run_case, judge.endpoint, pdf_dir, gt_dir, case_dir / "eval",
+                        workers, render_procs, verbose).result()
+
+                summary = json.loads(summary_path.read_text("utf-8"))
+                rows.append({
+                    "size":         f"{int(width)}x{int(height)}",
+                    "elements":     n_elements,
+                    "pdfs":         summary["evaluated"],
+                    "skipped":      len(summary["skipped"]),
+                    "judge_calls":  judge.calls - calls_before,
+                    "seconds":      round(elapsed, 3),
+                    "pdfs_per_sec": round(summary["evaluated"] / elapsed, 2) if elapsed else 0.0,
+                    "peak_rss_mb":  peak_rss,
+                    "stages":       summary.get("timings", {}),
+                })
+
+    return {
+        "workers":      workers,
+        "render_procs": render_procs,
+        "latency":      latency,
+        "jitter":       jitter,
+        "cases":        rows,
+    }
+
+def _parse_size(text: str) -> Tuple[float, float]:
+
+    w, h = text.lower().split("x")
+    return float(w), float(h)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for evaluation_code.py")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_ext = sub.add_parser("extract", help="time PDF label extraction")
+    p_ext.add_argument("--pdf_dir", default="result_pdfs")
+    p_ext.add_argument("--repeat", type=int, default=3)
+    p_ext.add_argument("--fallback_words", action="store_true",
+                       help="use PyMuPDF words for PDFs without a structure tree")
+    p_ext.add_argument("--out", default=None, help="optional JSON report path")
+
+    p_pipe = sub.add_parser("pipeline", help="run evaluate_batch on synthetic PDFs against a stub judge")
+    p_pipe.add_argument("--sizes", default="400x300,1200x900,2400x1800",
+                        help="comma-separated page sizes in points, WIDTHxHEIGHT")
+    p_pipe.add_argument("--elements", default="10,100,1000",
+                        help="comma-separated element counts per PDF")
+    p_pipe.add_argument("--pdfs", type=int, default=8, help="PDFs per size/element case")
+    p_pipe.add_argument("--workers", type=int, default=4)
+    p_pipe.add_argument("--render_procs", type=int, default=0)
+    p_pipe.add_argument("--latency", type=float, default=0.5, help="stub answer delay in seconds")
+    p_pipe.add_argument("--jitter", type=float, default=0.0,
+                        help="extra per-request delay in seconds, deterministic per request body")
+    p_pipe.add_argument("--answers", default=None,
+                        help='JSON file overriding the canned answers, keys "design", "blank", "labels"')
+    p_pipe.add_argument("--work_dir", default=None,
+                        help="keep generated PDFs and outputs here (default: temporary directory)")
+    p_pipe.add_argument("--verbose", action="store_true", help="show evaluate_batch output")
+    p_pipe.add_argument("--out", default=None, help="optional JSON report path")
+
+    args = parser.parse_args()
+
+    if args.cmd == "extract":
+        report = bench_extract(Path(args.pdf_dir), args.fallback_words, args.repeat)
+        for k, v in report.items():
+            if k != "details":
+                print(f"  {k:<14}: {v}")
+        if args.out:
+            Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2), "utf-8")
+            print("Saved report to", args.out)
+
+    elif args.cmd == "pipeline":
+        answers = json.loads(Path(args.answers).read_text("utf-8")) if args.answers else None
+        with contextlib.ExitStack() as stack:
+            work_dir = (Path(args.work_dir) if args.work_dir
+                        else Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="eval_bench_"))))
+            report = bench_pipeline(work_dir,
+                                    [_parse_size(s) for s in args.sizes.split(",")],
+                                    [int(n) for n in args.elements.split(",")],
+                                    args.pdfs, args.workers, args.render_procs,
+                                    args.latency, args.jitter, answers, args.verbose)
+        for case in report["cases"]:
+            stages = case["stages"]
+            stage_txt = ", ".join(f"{k} {stages[k]['p50']:.3f}/{stages[k]['p95']:.3f}s"
+                                  for k in ("extract", "render", "encode", "judges", "total") if k in stages)
+            print(f"  {case['size']:>10} x {case['elements']:>5} el: {case['pdfs_per_sec']:>6} PDFs/s, "
+                  f"peak RSS {case['peak_rss_mb']} MB | p50/p95 {stage_txt}")
+        if args.out:
+            Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2), "utf-8")
+            print("Saved report to", args.out)
+
+
+
+# python benchmark.py extract --pdf_dir result_pdfs --repeat 3
+# python benchmark.py pipeline --sizes 400x300,2400x1800 --elements 10,1000 --latency 0.5 --workers 8
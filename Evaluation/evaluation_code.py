@@ -1,17 +1,38 @@
 import argparse
+import asyncio
 import base64
+import bisect
+import contextvars
+import cProfile
+import hashlib
+import heapq
+import io
+import itertools
 import json
+import math
 import os
+import pstats
+import random
 import re
+import sqlite3
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
 from pathlib import Path
-from collections import Counter
-from typing import Dict, List, Tuple
+from queue import Empty, SimpleQueue
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
 
 import fitz                         
-from PIL import Image, ImageDraw
+import numpy as np
+import pandas as pd
+from PIL import Image
 import cv2
-from openai import AzureOpenAI
+import openai
+from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+import httpx
 import pikepdf
 from pikepdf import Dictionary, Array
 
@@ -21,6 +42,437 @@ AZURE_API_KEY    = ""
 AZURE_API_VERSION= ""
 AZURE_MODEL_NAME = ""
 
+RENDER_DPI       = 200
+GRID_SIZE        = 128
+STEP_K           = 50.0
+STEP_BONUS_RATIO = 0.08
+TEXT_FALLBACK_WORDS = False
+DOC_CACHE_MB        = 256
+STAGE_TIMINGS       = False
+PROFILE_TOP_FUNCS   = 40
+
+BLANK_METRIC     = "vlm"
+BLANK_INK_LEVEL  = 245
+BLANK_CELL_INK   = 0.002
+
+IMAGE_FORMAT     = "png"
+IMAGE_QUALITY    = 85
+IMAGE_MAX_EDGE   = 0
+IMAGE_MIME = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+WEIGHT_TABLE = {
+    "precision": 0.2,
+    "recall":    0.2,
+    "design":    0.2,
+    "blank":     0.05,
+    "read":      0.25,  
+    "align":     0.1,
+}
+
+VLM_MAX_CONCURRENCY = 4
+HTTP_POOL_SIZE       = 32
+HTTP_TIMEOUT         = 120.0
+HTTP_CONNECT_TIMEOUT = 10.0
+
+VLM_RPM              = 0        # requests per minute, 0 = unlimited
+VLM_TPM              = 0        # tokens per minute, 0 = unlimited
+VLM_MAX_RETRIES      = 6
+BACKOFF_BASE         = 1.0
+BACKOFF_CAP          = 60.0
+IMAGE_TOKEN_ESTIMATE = 1000
+COMPLETION_TOKEN_ESTIMATE = 500
+
+_FITZ_LOCK = threading.Lock()
+
+# All model calls run on one background event loop, so a single AsyncAzureOpenAI
+# client (and its keep-alive connection pool) is shared by every worker thread.
+_VLM_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_VLM_LOOP_LOCK = threading.Lock()
+_VLM_CLIENT: Optional[AsyncAzureOpenAI] = None
+_VLM_SEMAPHORE: Optional[asyncio.Semaphore] = None
+
+def _vlm_loop() -> asyncio.AbstractEventLoop:
+
+    global _VLM_LOOP
+    with _VLM_LOOP_LOCK:
+        if _VLM_LOOP is None:
+            _VLM_LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_VLM_LOOP.run_forever, name="vlm-loop", daemon=True).start()
+    return _VLM_LOOP
+
+def run_vlm(coro):
+
+    return asyncio.run_coroutine_threadsafe(coro, _vlm_loop()).result()
+
+def set_vlm_concurrency(max_calls: int):
+
+    global VLM_MAX_CONCURRENCY, _VLM_SEMAPHORE
+    VLM_MAX_CONCURRENCY = max(1, int(max_calls))
+    _VLM_SEMAPHORE = None
+
+def set_text_fallback_words(enabled: bool):
+
+    global TEXT_FALLBACK_WORDS
+    TEXT_FALLBACK_WORDS = bool(enabled)
+
+def set_stage_timings(enabled: bool):
+
+    global STAGE_TIMINGS
+    STAGE_TIMINGS = bool(enabled)
+
+# Per-PDF stage timings. The dict is bound to the context of the PDF being
+# evaluated, so gathered judge tasks and asyncio.to_thread helpers add to it.
+# Intervals with the same name are summed, so work that runs concurrently is
+# either timed once around the concurrent section or under distinct names.
+_STAGE_TIMES: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("stage_times", default=None)
+_STAGE_TIMES_LOCK = threading.Lock()
+
+@contextmanager
+def stage_timer(name: str):
+
+    timings = _STAGE_TIMES.get()
+    if timings is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        with _STAGE_TIMES_LOCK:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+def set_blank_metric(metric: str):
+
+    global BLANK_METRIC
+    if metric not in ("vlm", "local"):
+        raise ValueError(f"Unsupported blank metric: {metric}")
+    BLANK_METRIC = metric
+
+def configure_image_encoding(fmt: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY,
+                             max_edge: int = IMAGE_MAX_EDGE):
+
+    global IMAGE_FORMAT, IMAGE_QUALITY, IMAGE_MAX_EDGE
+    fmt = fmt.lower().replace("jpg", "jpeg")
+    if fmt not in IMAGE_MIME:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    IMAGE_FORMAT   = fmt
+    IMAGE_QUALITY  = int(quality)
+    IMAGE_MAX_EDGE = max(0, int(max_edge))
+
+def configure_http_pool(pool_size: int = HTTP_POOL_SIZE,
+                        timeout: float = HTTP_TIMEOUT,
+                        connect_timeout: float = HTTP_CONNECT_TIMEOUT):
+
+    global HTTP_POOL_SIZE, HTTP_TIMEOUT, HTTP_CONNECT_TIMEOUT, _VLM_CLIENT
+    HTTP_POOL_SIZE       = max(1, int(pool_size))
+    HTTP_TIMEOUT         = float(timeout)
+    HTTP_CONNECT_TIMEOUT = float(connect_timeout)
+    _VLM_CLIENT = None
+
+def get_vlm_client() -> AsyncAzureOpenAI:
+
+    global _VLM_CLIENT
+    if _VLM_CLIENT is None:
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE,
+                                max_keepalive_connections=HTTP_POOL_SIZE),
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+        _VLM_CLIENT = AsyncAzureOpenAI(
+            azure_endpoint=AZURE_ENDPOINT,
+            api_key=AZURE_API_KEY,
+            api_version=AZURE_API_VERSION,
+            http_client=http_client,
+            # Retries are handled by achat_completion so that they share the rate limiter.
+            max_retries=0,
+        )
+    return _VLM_CLIENT
+
+def _vlm_semaphore() -> asyncio.Semaphore:
+
+    global _VLM_SEMAPHORE
+    if _VLM_SEMAPHORE is None:
+        _VLM_SEMAPHORE = asyncio.Semaphore(VLM_MAX_CONCURRENCY)
+    return _VLM_SEMAPHORE
+
+class VLMResponseCache:
+
+    def __init__(self, db_path: Path, max_bytes: int = 256 * 1024 * 1024, refresh: bool = False):
+        self.db_path   = db_path
+        self.max_bytes = max_bytes
+        self.refresh   = refresh
+        self.hits      = 0
+        self.misses    = 0
+        self._lock     = threading.Lock()
+        ensure_out_dir(db_path.parent)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, content TEXT, size INTEGER, last_access REAL)"
+        )
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict]) -> str:
+
+        # Images are keyed by the SHA-256 of their raw bytes, not the base64 text.
+        parts = [model]
+        for msg in messages:
+            content = msg["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            parts.append(msg["role"])
+            for item in content:
+                if item["type"] == "text":
+                    parts.append("text:" + item["text"])
+                elif item["type"] == "image_url":
+                    url = item["image_url"]["url"]
+                    raw = base64.b64decode(url.split(",", 1)[1]) if url.startswith("data:") else url.encode()
+                    parts.append("image:" + hashlib.sha256(raw).hexdigest())
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+
+        with self._lock:
+            if self.refresh:
+                self.misses += 1
+                return None
+            row = self._conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, content: str):
+
+        size = len(content.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model, content, size, time.time()),
+            )
+            self._total += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+
+        while self._total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            self._total -= row[1]
+
+    def stats(self) -> Dict[str, int]:
+
+        return {"hits": self.hits, "misses": self.misses}
+
+_RESPONSE_CACHE: Optional[VLMResponseCache] = None
+_PAYLOAD_STATS = {"calls": 0, "image_bytes": 0}
+
+def payload_stats() -> Dict[str, float]:
+
+    calls = _PAYLOAD_STATS["calls"]
+    return {
+        "calls":       calls,
+        "image_bytes": _PAYLOAD_STATS["image_bytes"],
+        "avg_bytes":   _PAYLOAD_STATS["image_bytes"] / calls if calls else 0.0,
+    }
+
+def _image_payload_bytes(messages: List[Dict]) -> int:
+
+    total = 0
+    for msg in messages:
+        if isinstance(msg["content"], str):
+            continue
+        for item in msg["content"]:
+            if item["type"] == "image_url":
+                total += len(item["image_url"]["url"])
+    return total
+
+def configure_response_cache(db_path: Optional[Path], max_mb: float = 256, refresh: bool = False):
+
+    global _RESPONSE_CACHE
+    _RESPONSE_CACHE = None if db_path is None else VLMResponseCache(db_path, int(max_mb * 1024 * 1024), refresh)
+
+class RateLimiter:
+
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens   = float(tpm)
+        self._stamp    = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._stamp = now - self._stamp, now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60.0)
+
+    async def acquire(self, tokens: int) -> float:
+
+        # Token-bucket admission for one request; returns the seconds spent waiting.
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                delay = self._blocked_until - time.monotonic()
+                if self.rpm and self._requests < 1:
+                    delay = max(delay, (1 - self._requests) * 60.0 / self.rpm)
+                need = min(tokens, self.tpm)
+                if self.tpm and self._tokens < need:
+                    delay = max(delay, (need - self._tokens) * 60.0 / self.tpm)
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+                waited += delay
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+        return waited
+
+    def settle(self, delta_tokens: int):
+
+        if self.tpm:
+            self._tokens -= delta_tokens
+
+    def block_for(self, seconds: float):
+
+        # A server-side Retry-After pauses every caller, not just the throttled one.
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+_RATE_LIMITER = RateLimiter(VLM_RPM, VLM_TPM)
+_SCHED_STATS = {"retries": 0, "rate_limited": 0, "throttled_seconds": 0.0}
+
+def configure_rate_limits(rpm: float = VLM_RPM, tpm: float = VLM_TPM,
+                          max_retries: int = VLM_MAX_RETRIES):
+
+    global VLM_RPM, VLM_TPM, VLM_MAX_RETRIES, _RATE_LIMITER
+    VLM_RPM, VLM_TPM = max(0, rpm), max(0, tpm)
+    VLM_MAX_RETRIES  = max(0, int(max_retries))
+    _RATE_LIMITER    = RateLimiter(VLM_RPM, VLM_TPM)
+
+def scheduler_stats() -> Dict[str, float]:
+
+    return dict(_SCHED_STATS)
+
+def reset_run_stats():
+
+    # Called at the start of every batch so its report covers that run only.
+    _SCHED_STATS.update(retries=0, rate_limited=0, throttled_seconds=0.0)
+    _PAYLOAD_STATS.update(calls=0, image_bytes=0)
+    if _RESPONSE_CACHE is not None:
+        _RESPONSE_CACHE.hits = _RESPONSE_CACHE.misses = 0
+
+def _estimate_tokens(messages: List[Dict]) -> int:
+
+    tokens = COMPLETION_TOKEN_ESTIMATE
+    for msg in messages:
+        content = msg["content"]
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for item in content:
+            if item["type"] == "text":
+                tokens += len(item["text"]) // 4
+            elif item["type"] == "image_url":
+                tokens += IMAGE_TOKEN_ESTIMATE
+    return tokens
+
+def _retry_after_seconds(err: Exception) -> Optional[float]:
+
+    response = getattr(err, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000.0
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+async def _create_with_retry(client: AsyncAzureOpenAI, messages: List[Dict]):
+
+    estimate = _estimate_tokens(messages)
+    for attempt in range(VLM_MAX_RETRIES + 1):
+        _SCHED_STATS["throttled_seconds"] += await _RATE_LIMITER.acquire(estimate)
+        try:
+            async with _vlm_semaphore():
+                rsp = await client.chat.completions.create(model=AZURE_MODEL_NAME, messages=messages)
+        except RETRYABLE_ERRORS as e:
+            if attempt >= VLM_MAX_RETRIES:
+                raise
+            retry_after = _retry_after_seconds(e)
+            if isinstance(e, openai.RateLimitError):
+                _SCHED_STATS["rate_limited"] += 1
+            if retry_after is not None:
+                delay = retry_after + random.uniform(0, BACKOFF_BASE)
+                _RATE_LIMITER.block_for(delay)
+            else:
+                # Exponential backoff with full jitter.
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            _SCHED_STATS["retries"] += 1
+            _SCHED_STATS["throttled_seconds"] += delay
+            await asyncio.sleep(delay)
+            continue
+        usage = getattr(rsp, "usage", None)
+        if usage is not None and usage.total_tokens:
+            _RATE_LIMITER.settle(usage.total_tokens - estimate)
+        return rsp
+
+async def achat_completion(messages: List[Dict], parse: Optional[Callable[[str], object]] = None):
+
+    # With `parse`, its result is returned and the reply is only cached once it
+    # parses, so a malformed answer is asked again instead of failing forever.
+    # Cache I/O (hashing, SQLite commits) runs off the event loop.
+    cache = _RESPONSE_CACHE
+    key = None
+    if cache is not None:
+        key = await asyncio.to_thread(cache.make_key, AZURE_MODEL_NAME, messages)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            return parse(cached) if parse is not None else cached
+
+    client = get_vlm_client()
+    _PAYLOAD_STATS["calls"] += 1
+    _PAYLOAD_STATS["image_bytes"] += _image_payload_bytes(messages)
+    rsp = await _create_with_retry(client, messages)
+    content = rsp.choices[0].message.content
+    result = parse(content) if parse is not None else content
+    if cache is not None and content:
+        await asyncio.to_thread(cache.put, key, AZURE_MODEL_NAME, content)
+    return result
+
+def chat_completion(messages: List[Dict], parse: Optional[Callable[[str], object]] = None):
+
+    return run_vlm(achat_completion(messages, parse))
+
 STEP_PAT = re.compile(r"_step_(\d+)", re.IGNORECASE)
 
 def extract_step_number(pdf_name: str) -> int:
@@ -33,42 +485,71 @@ def ensure_out_dir(out_dir: Path):
     if not out_dir.exists():
         out_dir.mkdir(parents=True, exist_ok=True)
 
+LABEL_KEY_PAT  = re.compile(r'"label"\s*:\s*"([^"]+)"')
+# Everything outside [0-9a-z+] is dropped; this one pattern subsumes the
+# punctuation and bracket passes that used to run before it.
+NON_TOKEN_PAT  = re.compile(r"[^0-9a-z\+]+")
+
 def normalize_tokens(txt: str) -> List[str]:
 
     if '"label"' in txt:                                    
-        raw_labels = re.findall(r'"label"\s*:\s*"([^"]+)"', txt)
+        raw_labels = LABEL_KEY_PAT.findall(txt)
     else:                                                  
         raw_labels = [line.strip() for line in txt.splitlines() if line.strip()]
 
-
+    sub = NON_TOKEN_PAT.sub
     norm_labels: List[str] = []
     for lab in raw_labels:
-        lab_low = lab.lower()
-
-
-        lab_low = re.sub(r"[\s\.,;:!?\-—_·`'\"“”‘’]", "", lab_low)
-
-        lab_low = re.sub(r"[()\[\]{}<>（）【】]", "", lab_low)
-
-
-        lab_low = re.sub(r"[^0-9a-z\+]+", "", lab_low)
-
+        lab_low = sub("", lab.lower())
         if lab_low:                                         
             norm_labels.append(lab_low)
 
     return norm_labels
 
 
-def counter_overlap(tokens_a: List[str], tokens_b: List[str]) -> Tuple[float, float]:
+def counter_overlap(tokens_a: List[str], tokens_b: List[str],
+                    cnt_a: Optional[Counter] = None,
+                    cnt_b: Optional[Counter] = None) -> Tuple[float, float]:
 
     if not tokens_a or not tokens_b:
         return 0.0, 0.0
-    cnt_a, cnt_b = Counter(tokens_a), Counter(tokens_b)
+    cnt_a = cnt_a if cnt_a is not None else Counter(tokens_a)
+    cnt_b = cnt_b if cnt_b is not None else Counter(tokens_b)
     common = (cnt_a & cnt_b).total()
     precision = common / len(tokens_a)
     recall    = common / len(tokens_b)
     return precision, recall
 
+class GTEntry(NamedTuple):
+    n_elements: int
+    tokens:     List[str]
+    counter:    Counter
+
+def load_gt_entry(gt_path: Path) -> GTEntry:
+
+    gt_prompt = json.loads(gt_path.read_text("utf-8"))
+    tokens = normalize_tokens("\n".join(obj["label"] for obj in gt_prompt))
+    return GTEntry(len(gt_prompt), tokens, Counter(tokens))
+
+class GTIndex:
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, int], GTEntry] = {}
+        self._lock = threading.Lock()
+
+    def get(self, gt_path: Path) -> GTEntry:
+        key = (str(gt_path.resolve()), gt_path.stat().st_mtime_ns)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = load_gt_entry(gt_path)
+            with self._lock:
+                self._entries[key] = entry
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
 def inverse_ratio(val: float, max_fail: float = 1.0) -> float:
 
     return 1.0 / (1.0 + 2*val / max_fail)
@@ -78,45 +559,175 @@ def encode_image_b64(img_path: Path) -> str:
     return base64.b64encode(img_path.read_bytes()).decode()
 
 
-def pdf_extract_text(pdf_path: Path, save_dir: Path) -> Tuple[str, Path]:
-
-    collected: List[str] = []
+class CachedPDF:
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._fitz = None
+        self._pike = None
+
+    @property
+    def fitz_doc(self):
+        if self._fitz is None:
+            self._fitz = fitz.open(stream=self.data, filetype="pdf")
+        return self._fitz
+
+    @property
+    def pike_doc(self) -> pikepdf.Pdf:
+        if self._pike is None:
+            self._pike = pikepdf.open(io.BytesIO(self.data))
+        return self._pike
+
+    def close(self):
+        if self._fitz is not None:
+            self._fitz.close()
+        if self._pike is not None:
+            self._pike.close()
+        self._fitz = self._pike = None
+
+class PDFDocumentCache:
+
+    def __init__(self, max_bytes: int, max_docs: int = 4):
+        self.max_bytes = max_bytes
+        self.max_docs  = max_docs
+        # Parsed documents are kept per worker thread (neither library is
+        # thread-safe); rendered pages are plain arrays and shared process-wide.
+        self._local    = threading.local()
+        self._lock     = threading.Lock()
+        self._pixmaps: "OrderedDict[Tuple[str, int, int], np.ndarray]" = OrderedDict()
+        self._pix_bytes = 0
+
+    @staticmethod
+    def _key(pdf_path: Path) -> Tuple[str, int]:
+        return str(pdf_path.resolve()), pdf_path.stat().st_mtime_ns
+
+    def document(self, pdf_path: Path) -> CachedPDF:
+        docs = getattr(self._local, "docs", None)
+        if docs is None:
+            docs = self._local.docs = OrderedDict()
+        key = self._key(pdf_path)
+        entry = docs.get(key)
+        if entry is not None:
+            docs.move_to_end(key)
+            return entry
+        entry = docs[key] = CachedPDF(pdf_path.read_bytes())
+        while len(docs) > self.max_docs:
+            docs.popitem(last=False)[1].close()
+        return entry
+
+    def render(self, pdf_path: Path, dpi: int) -> np.ndarray:
+        key = self._key(pdf_path) + (dpi,)
+        with self._lock:
+            arr = self._pixmaps.get(key)
+            if arr is not None:
+                self._pixmaps.move_to_end(key)
+                return arr
+
+        doc = self.document(pdf_path)
+        with _FITZ_LOCK:
+            arr = _render_page_array(doc.fitz_doc, dpi)
+        arr.setflags(write=False)
+
+        with self._lock:
+            if key not in self._pixmaps and arr.nbytes <= self.max_bytes:
+                self._pixmaps[key] = arr
+                self._pix_bytes += arr.nbytes
+                while self._pix_bytes > self.max_bytes:
+                    _, old = self._pixmaps.popitem(last=False)
+                    self._pix_bytes -= old.nbytes
+        return arr
+
+_DOC_CACHE: Optional[PDFDocumentCache] = PDFDocumentCache(DOC_CACHE_MB * 1024 * 1024)
+
+def configure_doc_cache(max_mb: float = DOC_CACHE_MB):
+
+    global DOC_CACHE_MB, _DOC_CACHE
+    DOC_CACHE_MB = max_mb
+    _DOC_CACHE = PDFDocumentCache(int(max_mb * 1024 * 1024)) if max_mb > 0 else None
+
+REG_PAGE_LABEL  = re.compile(r"^页\s*-\s*\d+$")
+REG_SHEET_LABEL = re.compile(r"^sheet\.\d+$", re.I)
+
+def _struct_node_text(node: Dictionary) -> Optional[str]:
+
+    txt_value = None
+    if "/A" in node and isinstance(node.A, Dictionary) and "/ActualText" in node.A:
+        txt_value = str(node.A["/ActualText"])
+    elif "/Alt" in node:
+        txt_value = str(node.Alt)
+
+    if not txt_value:
+        return None
+
+    txt_value = txt_value.strip()
+    if (not txt_value or REG_PAGE_LABEL.match(txt_value) or REG_SHEET_LABEL.match(txt_value)):
+        return None
+    return txt_value
+
+def iter_struct_labels(root: Dictionary) -> Iterator[str]:
+
+    # Iterative post-order walk (children before their parent, like the original
+    # recursive version). Indirect objects are visited once, which both breaks
+    # reference cycles and skips subtrees shared between several parents.
+    seen = set()
+    stack: List[Tuple[object, bool]] = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if not isinstance(node, Dictionary):
+            continue
 
-    reg_page  = re.compile(r"^页\s*-\s*\d+$")
-    reg_sheet = re.compile(r"^sheet\.\d+$", re.I)
+        if expanded:
+            txt_value = _struct_node_text(node)
+            if txt_value:
+                yield txt_value
+            continue
 
-    def _walk(node):
-        if not isinstance(node, Dictionary):
-            return
+        if node.is_indirect:
+            if node.objgen in seen:
+                continue
+            seen.add(node.objgen)
 
+        stack.append((node, True))
         if "/K" in node:
             kids = node.K
             if isinstance(kids, Array):
-                for kid in kids:
-                    _walk(kid)
+                stack.extend((kid, False) for kid in reversed(list(kids)))
             else:
-                _walk(kids)
+                stack.append((kids, False))
 
-        txt_value = None
-        if "/A" in node and "/ActualText" in node.A:
-            txt_value = str(node.A["/ActualText"])
-        elif "/Alt" in node:
-            txt_value = str(node.Alt)
-
-        if not txt_value:
-            return
+def iter_pdf_labels(pdf_path: Path, fallback_words: bool = False) -> Iterator[str]:
 
-        txt_value = txt_value.strip()
-        if (not txt_value or reg_page.match(txt_value) or reg_sheet.match(txt_value)):
+    cache = _DOC_CACHE
+    if cache is not None:
+        pdf = cache.document(pdf_path).pike_doc
+        if "/StructTreeRoot" in pdf.Root:
+            yield from iter_struct_labels(pdf.Root.StructTreeRoot)
             return
+    else:
+        with pikepdf.open(pdf_path) as pdf:
+            if "/StructTreeRoot" in pdf.Root:
+                yield from iter_struct_labels(pdf.Root.StructTreeRoot)
+                return
+
+    if fallback_words:
+        with _FITZ_LOCK:
+            if cache is not None:
+                doc = cache.document(pdf_path).fitz_doc
+                words = [w[4] for page in doc for w in page.get_text("words")]
+            else:
+                with fitz.open(pdf_path) as doc:
+                    words = [w[4] for page in doc for w in page.get_text("words")]
+        for word in words:
+            word = word.strip()
+            if word:
+                yield word
 
-        collected.append(txt_value)
-
-
-    with pikepdf.open(pdf_path) as pdf:
-        if "/StructTreeRoot" in pdf.Root:
-            _walk(pdf.Root.StructTreeRoot)
+def pdf_extract_text(pdf_path: Path, save_dir: Path,
+                     fallback_words: Optional[bool] = None) -> Tuple[str, Path]:
 
+    if fallback_words is None:
+        fallback_words = TEXT_FALLBACK_WORDS
+    collected = list(iter_pdf_labels(pdf_path, fallback_words))
 
     json_path = save_dir / f"{pdf_path.stem}_pdf_labels.json"
     text_json = [{"label": t} for t in collected]
@@ -124,41 +735,123 @@ def pdf_extract_text(pdf_path: Path, save_dir: Path) -> Tuple[str, Path]:
 
     return "\n".join(collected), json_path
 
-def pdf_render_first_page(pdf_path: Path, save_dir: Path, dpi: int = 200) -> Path:
+def _render_page_array(doc, dpi: int) -> np.ndarray:
 
-    png_path = save_dir / f"{pdf_path.stem}.png"
     zoom = dpi / 72.0
-    matrix = fitz.Matrix(zoom, zoom)
-    with fitz.open(pdf_path) as doc:
-        pix = doc.load_page(0).get_pixmap(matrix=matrix, alpha=False)
-        img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
-        img.save(png_path)
+    pix = doc.load_page(0).get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    buf = np.frombuffer(pix.samples, dtype=np.uint8)
+    arr = buf.reshape(pix.height, pix.stride)[:, :pix.width * pix.n]
+    return arr.reshape(pix.height, pix.width, pix.n).copy()
+
+def pdf_render_first_page_array(pdf_path: Path, dpi: int = RENDER_DPI) -> np.ndarray:
+
+    if _DOC_CACHE is not None:
+        return _DOC_CACHE.render(pdf_path, dpi)
+    # PyMuPDF is not thread-safe; serialize rendering across batch workers.
+    with _FITZ_LOCK, fitz.open(pdf_path) as doc:
+        return _render_page_array(doc, dpi)
+
+def save_png_array(arr: np.ndarray, png_path: Path) -> Path:
+
+    if not cv2.imwrite(str(png_path), cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)):
+        raise RuntimeError(f"Unable to write image: {png_path}")
     return png_path
 
-def add_grid_to_png(png_path: Path, save_dir: Path, grid_size: int = 128) -> Path:
+def pdf_render_first_page(pdf_path: Path, save_dir: Path, dpi: int = RENDER_DPI) -> Path:
 
-    img = Image.open(png_path).convert("RGB")
-    w, h = img.size
-    draw = ImageDraw.Draw(img)
-    for x in range(0, w, grid_size):
-        draw.line([(x, 0), (x, h)], fill=(0, 0, 0), width=1)
-    for y in range(0, h, grid_size):
-        draw.line([(0, y), (w, y)], fill=(0, 0, 0), width=1)
+    png_path = save_dir / f"{pdf_path.stem}.png"
+    return save_png_array(pdf_render_first_page_array(pdf_path, dpi), png_path)
+
+def add_grid_to_array(arr: np.ndarray, grid_size: int = GRID_SIZE) -> np.ndarray:
+
+    grid = arr.copy()
+    grid[:, ::grid_size] = 0
+    grid[::grid_size, :] = 0
+    return grid
+
+def add_grid_to_png(png_path: Path, save_dir: Path, grid_size: int = GRID_SIZE) -> Path:
+
+    arr = np.asarray(Image.open(png_path).convert("RGB"))
     grid_png = save_dir / f"{png_path.stem}_grid.png"
-    img.save(grid_png)
-    return grid_png
+    return save_png_array(add_grid_to_array(arr, grid_size), grid_png)
 
 
-def alignment_score(png_path: Path) -> float:
+def alignment_score_array(arr: np.ndarray) -> float:
 
-    img = cv2.imread(str(png_path))
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
     horizontal_projection = gray.mean(axis=1)
     var_value = float(horizontal_projection.var())
     score = 1.0 / (1.0 + var_value / 1e4)   
     return score
 
-def gpt_design_errors(png_path: Path) -> Tuple[int, str]:
+def alignment_score(png_path: Path) -> float:
+
+    img = cv2.imread(str(png_path))
+    return alignment_score_array(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+
+ImageInput = Union[Path, np.ndarray]
+
+def blank_cell_mask(arr: np.ndarray, grid_size: int = GRID_SIZE) -> np.ndarray:
+
+    gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
+    h, w = gray.shape
+    rows, cols = -(-h // grid_size), -(-w // grid_size)
+    ink = np.zeros((rows * grid_size, cols * grid_size), dtype=np.float32)
+    ink[:h, :w] = gray < BLANK_INK_LEVEL
+    area = np.zeros_like(ink)
+    area[:h, :w] = 1.0
+    # Block reduction: one (rows, cols) ink fraction per grid cell, edge cells clipped.
+    ink_cells  = ink.reshape(rows, grid_size, cols, grid_size).sum(axis=(1, 3))
+    area_cells = area.reshape(rows, grid_size, cols, grid_size).sum(axis=(1, 3))
+    return ink_cells / area_cells < BLANK_CELL_INK
+
+def local_blank_ratio(arr: np.ndarray, grid_size: int = GRID_SIZE) -> float:
+
+    blank = blank_cell_mask(arr, grid_size)
+    used_rows = np.flatnonzero(~blank.all(axis=1))
+    used_cols = np.flatnonzero(~blank.all(axis=0))
+    if used_rows.size == 0:
+        return 0.0
+    # Margins outside the bounding box of the drawing are not counted, matching
+    # the "not the blank space at the edges" rule of the VLM prompt.
+    interior = blank[used_rows[0]:used_rows[-1] + 1, used_cols[0]:used_cols[-1] + 1]
+    return float(interior.sum()) / blank.size
+
+def projection_alignment(arr: np.ndarray) -> float:
+
+    gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY).astype(np.float32)
+    var_value = (float(gray.mean(axis=1).var()) + float(gray.mean(axis=0).var())) / 2.0
+    return 1.0 / (1.0 + var_value / 1e4)
+
+def encode_image_array(arr: np.ndarray) -> Tuple[str, bytes]:
+
+    h, w = arr.shape[:2]
+    if IMAGE_MAX_EDGE and max(h, w) > IMAGE_MAX_EDGE:
+        scale = IMAGE_MAX_EDGE / max(h, w)
+        arr = cv2.resize(arr, (max(1, round(w * scale)), max(1, round(h * scale))),
+                         interpolation=cv2.INTER_AREA)
+    params: List[int] = []
+    if IMAGE_FORMAT == "jpeg":
+        params = [cv2.IMWRITE_JPEG_QUALITY, IMAGE_QUALITY]
+    elif IMAGE_FORMAT == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, IMAGE_QUALITY]
+    ok, buf = cv2.imencode(f".{IMAGE_FORMAT}", cv2.cvtColor(arr, cv2.COLOR_RGB2BGR), params)
+    if not ok:
+        raise RuntimeError(f"Unable to encode the rendered page as {IMAGE_FORMAT}")
+    return IMAGE_MIME[IMAGE_FORMAT], buf.tobytes()
+
+def image_data_url(image: ImageInput) -> str:
+
+    if isinstance(image, np.ndarray):
+        mime, data = encode_image_array(image)
+    elif IMAGE_FORMAT == "png" and not IMAGE_MAX_EDGE and image.suffix.lower() == ".png":
+        return f"data:image/png;base64,{encode_image_b64(image)}"
+    else:
+        arr = cv2.cvtColor(cv2.imread(str(image)), cv2.COLOR_BGR2RGB)
+        mime, data = encode_image_array(arr)
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+async def agpt_design_errors(png_path: ImageInput, image_url: Optional[str] = None) -> Tuple[int, str]:
 
     prompt =(
             f"You need to observe this picture carefully. This is a scientific research drawing. How many unreasonable aspects do you think there are in this image?"
@@ -167,25 +860,21 @@ def gpt_design_errors(png_path: Path) -> Tuple[int, str]:
             f"When finding problems, you must be strict and try to find as many design errors as possible. But at the same time, each problem must be well - founded."
             f"At the end, you need to output only one number representing the number of errors. Make a line break from the previous content. Write only one integer on a separate line at the end to represent the total number of errors."
     )
-    client = AzureOpenAI(
-        azure_endpoint=AZURE_ENDPOINT,
-        api_key=AZURE_API_KEY,
-        api_version=AZURE_API_VERSION,
-    )
-    b64 = encode_image_b64(png_path)
-    response = client.chat.completions.create(
-        model=AZURE_MODEL_NAME,
-        messages=[
+    if image_url is None:
+        with stage_timer("encode"):
+            image_url = await asyncio.to_thread(image_data_url, png_path)
+    with stage_timer("judge_design"):
+        return await achat_completion([
             {
                 "role": "user",
                 "content": [
                     {"type": "text",      "text": prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}"}}
+                    {"type": "image_url", "image_url": {"url": image_url}}
                 ]
             }
-        ]
-    )
-    content = response.choices[0].message.content
+        ], parse=_parse_design_errors)
+
+def _parse_design_errors(content: str) -> Tuple[int, str]:
 
     match = re.search(r"(\d+)\s*$", content)
     if not match:
@@ -194,7 +883,12 @@ def gpt_design_errors(png_path: Path) -> Tuple[int, str]:
     analysis   = content.rsplit("\n", 1)[0]  
     return num_errors, analysis
 
-def gpt_blank_ratio(grid_png: Path, grid_size: int = 128) -> float:
+def gpt_design_errors(png_path: ImageInput) -> Tuple[int, str]:
+
+    return run_vlm(agpt_design_errors(png_path))
+
+async def agpt_blank_ratio(grid_png: ImageInput, grid_size: int = GRID_SIZE,
+                           image_url: Optional[str] = None) -> float:
 
     prompt =(
         f"This is a scientific research drawing. A black grid with a size of {grid_size} pixels has been added to the drawing."
@@ -203,28 +897,29 @@ def gpt_blank_ratio(grid_png: Path, grid_size: int = 128) -> float:
         f"it is not considered as wrong blank space. You only need to estimate the area of the wrong blank space that makes the picture look worse."
         f"Finally, only output the number without any unit or explanation."
     )
-    client = AzureOpenAI(
-        azure_endpoint=AZURE_ENDPOINT,
-        api_key=AZURE_API_KEY,
-        api_version=AZURE_API_VERSION,
-    )
-    b64 = encode_image_b64(grid_png)
-    rsp = client.chat.completions.create(
-        model=AZURE_MODEL_NAME,
-        messages=[{
+    if image_url is None:
+        with stage_timer("encode"):
+            image_url = await asyncio.to_thread(image_data_url, grid_png)
+    with stage_timer("judge_blank"):
+        return await achat_completion([{
             "role": "user",
             "content": [
                 {"type":"text", "text": prompt},
-                {"type":"image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}"}}
+                {"type":"image_url", "image_url": {"url": image_url}}
             ]
-        }]
-    )
-    content = rsp.choices[0].message.content.strip()
-    m = re.search(r"[-+]?\d*\.?\d+", content)
+        }], parse=_parse_blank_ratio)
+
+def _parse_blank_ratio(content: str) -> float:
+
+    m = re.search(r"[-+]?\d*\.?\d+", content.strip())
     if not m:
-        raise RuntimeError("Unable to parse the white space ratio returned by GPT: \n" + content)
+        raise RuntimeError("Unable to parse the white space ratio returned by GPT: \n" + content.strip())
     return float(m.group(0))
 
+def gpt_blank_ratio(grid_png: ImageInput, grid_size: int = GRID_SIZE) -> float:
+
+    return run_vlm(agpt_blank_ratio(grid_png, grid_size))
+
 READ_PROMPT = (
     f"Please list all the text elements that appear in this scientific research drawing (including module titles, annotations, formulas, etc.)."
     f"When searching, it needs to be carried out strictly. If the text is occluded, overlapped, or a word has an unexpected line break, it is not considered readable."
@@ -233,58 +928,92 @@ READ_PROMPT = (
     f"Do not output any additional explanations, annotations, or key names."
 )
 
-def gpt_extract_labels(png_path: Path, save_dir: Path) -> Tuple[List[str], Path]:
+async def agpt_extract_labels(png_path: ImageInput, save_dir: Path,
+                              stem: Optional[str] = None,
+                              image_url: Optional[str] = None) -> Tuple[List[str], Path]:
 
-    client = AzureOpenAI(
-        azure_endpoint=AZURE_ENDPOINT,
-        api_key=AZURE_API_KEY,
-        api_version=AZURE_API_VERSION,
-    )
-    b64 = encode_image_b64(png_path)
+    if image_url is None:
+        with stage_timer("encode"):
+            image_url = await asyncio.to_thread(image_data_url, png_path)
     messages = [{
         "role":"user",
         "content":[
             {"type":"text", "text": READ_PROMPT},
             {"type":"image_url",
-             "image_url":{"url": f"data:image/jpeg;base64,{b64}"}}
+             "image_url":{"url": image_url}}
         ]
     }]
     content = ""
 
     for _ in range(3):
-        rsp = client.chat.completions.create(model=AZURE_MODEL_NAME, messages=messages)
-        content = rsp.choices[0].message.content.strip()
-        m = re.search(r"\[.*\]", content, re.S)
         try:
-            labels_json = json.loads(m.group(0) if m else content)
-            if isinstance(labels_json, list):
-                labels = [str(x).strip() for x in labels_json if str(x).strip()]
-                break
-        except json.JSONDecodeError:
+            with stage_timer("judge_labels"):
+                labels = await achat_completion(messages, parse=_parse_labels)
+            break
+        except ValueError as e:
+            content = str(e)
             messages.append({"role":"system","content":"Only output a pure JSON array!"})
     else:
         raise RuntimeError("The GPT response cannot be parsed into an array: \n" + content)
 
-    out_json_path = save_dir / f"{png_path.stem}_pdf_labels_readability.json"
+    out_json_path = save_dir / f"{stem or png_path.stem}_pdf_labels_readability.json"
     out_json_path.write_text(json.dumps([{"label": l} for l in labels],
                                         ensure_ascii=False, indent=2), "utf-8")
     return labels, out_json_path
 
+def _parse_labels(content: str) -> List[str]:
+
+    # ValueError carries the reply, so the caller can retry and report it.
+    content = content.strip()
+    m = re.search(r"\[.*\]", content, re.S)
+    try:
+        labels_json = json.loads(m.group(0) if m else content)
+    except json.JSONDecodeError:
+        raise ValueError(content) from None
+    if not isinstance(labels_json, list):
+        raise ValueError(content)
+    return [str(x).strip() for x in labels_json if str(x).strip()]
+
+def gpt_extract_labels(png_path: ImageInput, save_dir: Path,
+                       stem: Optional[str] = None) -> Tuple[List[str], Path]:
+
+    return run_vlm(agpt_extract_labels(png_path, save_dir, stem))
+
+async def run_vlm_judges(png_path: ImageInput, grid_png: ImageInput, save_dir: Path,
+                         stem: Optional[str] = None,
+                         with_blank: bool = True) -> Tuple[Tuple[int, str], Optional[float], Tuple[List[str], Path]]:
+
+    # The page is encoded once and shared by the design and label judges; the
+    # page and grid encodes overlap and are timed once, as wall time.
+    with stage_timer("encode"):
+        urls = await asyncio.gather(*(asyncio.to_thread(image_data_url, img)
+                                      for img in ([png_path, grid_png] if with_blank else [png_path])))
+    page_url, grid_url = urls[0], (urls[1] if with_blank else None)
+    jobs = [agpt_design_errors(png_path, page_url), agpt_extract_labels(png_path, save_dir, stem, page_url)]
+    if with_blank:
+        jobs.append(agpt_blank_ratio(grid_png, image_url=grid_url))
+    design, labels, *blank = await asyncio.gather(*jobs)
+    return design, (blank[0] if blank else None), labels
+
 def readability_precision(pred_labels: List[str],
-                          ref_labels:  List[str]) -> Tuple[float, List[str], List[str]]:
+                          ref_labels:  List[str],
+                          ref_tokens:  Optional[List[str]] = None,
+                          ref_counter: Optional[Counter] = None) -> Tuple[float, List[str], List[str]]:
 
     pred_tokens = normalize_tokens("\n".join(pred_labels))
-    ref_tokens  = normalize_tokens("\n".join(ref_labels))
+    if ref_tokens is None:
+        ref_tokens = normalize_tokens("\n".join(ref_labels))
 
     if not pred_tokens:
         return 0.0, pred_tokens, ref_tokens
 
-    common = (Counter(pred_tokens) & Counter(ref_tokens)).total()
+    ref_counter = ref_counter if ref_counter is not None else Counter(ref_tokens)
+    common = (Counter(pred_tokens) & ref_counter).total()
     precision = common / len(ref_tokens)
     return precision, pred_tokens, ref_tokens
 
 def adjust_with_steps(score_pre: float, steps: int,
-                      K: float = 50.0, bonus_ratio: float = 0.08) -> float:
+                      K: float = STEP_K, bonus_ratio: float = STEP_BONUS_RATIO) -> float:
 
     sat      = steps / (steps + K)                    
     penalty  = (1.0 - score_pre) * sat
@@ -294,51 +1023,90 @@ def adjust_with_steps(score_pre: float, steps: int,
     final    = max(0.0, min(1.0, score_p + bonus))
     return final
 
-def evaluate_single_pdf(pdf_path: Path, gt_prompt_path: Path, out_dir: Path) -> Path:
-
-    ensure_out_dir(out_dir)
-
-    gt_prompt = json.loads(gt_prompt_path.read_text("utf-8"))
-    
-    step_number = extract_step_number(pdf_path.name)   
-    pdf_text, text_json_path = pdf_extract_text(pdf_path, out_dir)
-
-    pdf_labels_raw = [obj["label"] for obj in json.loads(text_json_path.read_text())]
-    gt_labels_raw  = [obj["label"] for obj in gt_prompt]
-
-    pdf_tokens = normalize_tokens("\n".join(pdf_labels_raw))    
-    gt_tokens  = normalize_tokens("\n".join(gt_labels_raw))     
+def prepare_pdf(pdf_path: Path, out_dir: Path) -> Dict:
+
+    # CPU-bound stage: structure-tree labels and the rasterized first page.
+    timings: Optional[Dict[str, float]] = {} if STAGE_TIMINGS else None
+    token = _STAGE_TIMES.set(timings)
+    try:
+        with stage_timer("prepare"):
+            ensure_out_dir(out_dir)
+            with stage_timer("extract"):
+                pdf_text, text_json_path = pdf_extract_text(pdf_path, out_dir)
+            pdf_labels_raw = [obj["label"] for obj in json.loads(text_json_path.read_text("utf-8"))]
+            with stage_timer("render"):
+                page = pdf_render_first_page_array(pdf_path)
+    finally:
+        _STAGE_TIMES.reset(token)
+    return {
+        "labels":    pdf_labels_raw,
+        "text_json": text_json_path.name,
+        "page":      page,
+        "timings":   timings,
+    }
 
-    precision_text, recall_text = counter_overlap(pdf_tokens, gt_tokens)
+def _page_metrics(page_arr: np.ndarray, grid_arr: np.ndarray) -> Dict[str, float]:
 
-    png_path = pdf_render_first_page(pdf_path, out_dir)
+    with stage_timer("metrics"):
+        metrics = {"align": alignment_score_array(grid_arr)}
+        if BLANK_METRIC == "local":
+            metrics["blank_ratio"] = local_blank_ratio(page_arr)
+            metrics["align_proj"]  = projection_alignment(page_arr)
+    return metrics
 
+async def score_prepared_pdf(pdf_path: Path, prepared: Dict, gt_entry: GTEntry, out_dir: Path,
+                             keep_artifacts: bool = False) -> Path:
 
-    err_count, err_analysis = gpt_design_errors(png_path)
-    design_score = inverse_ratio(err_count / max(len(gt_prompt), 1))
+    timings = prepared.get("timings")
+    token = _STAGE_TIMES.set(timings)
+    try:
+        return await _score_prepared_pdf(pdf_path, prepared, gt_entry, out_dir, keep_artifacts, timings)
+    finally:
+        _STAGE_TIMES.reset(token)
 
+async def _score_prepared_pdf(pdf_path: Path, prepared: Dict, gt_entry: GTEntry, out_dir: Path,
+                              keep_artifacts: bool, timings: Optional[Dict[str, float]]) -> Path:
 
-    grid_png = add_grid_to_png(png_path, out_dir)
-    blank_ratio = gpt_blank_ratio(grid_png)
+    started = time.perf_counter()
+    step_number = extract_step_number(pdf_path.name)   
+    pdf_labels_raw = prepared["labels"]
+
+    pdf_tokens  = normalize_tokens("\n".join(pdf_labels_raw))    
+    pdf_counter = Counter(pdf_tokens)
+    gt_tokens   = gt_entry.tokens
+
+    precision_text, recall_text = counter_overlap(pdf_tokens, gt_tokens, pdf_counter, gt_entry.counter)
+
+    # The page is rasterized once; grid overlay, alignment and model payloads
+    # are all derived from the in-memory array.
+    page_arr = prepared["page"]
+    with stage_timer("grid"):
+        grid_arr = await asyncio.to_thread(add_grid_to_array, page_arr)
+    png_path = grid_png = None
+    if keep_artifacts:
+        png_path = await asyncio.to_thread(save_png_array, page_arr, out_dir / f"{pdf_path.stem}.png")
+        grid_png = await asyncio.to_thread(save_png_array, grid_arr, out_dir / f"{pdf_path.stem}_grid.png")
+
+    use_local_blank = BLANK_METRIC == "local"
+    with stage_timer("judges"):
+        judged, metrics = await asyncio.gather(
+            run_vlm_judges(page_arr, grid_arr, out_dir, pdf_path.stem, with_blank=not use_local_blank),
+            asyncio.to_thread(_page_metrics, page_arr, grid_arr),
+        )
+    (err_count, err_analysis), blank_ratio, (gpt_labels, gpt_json_path) = judged
+    if use_local_blank:
+        blank_ratio = metrics["blank_ratio"]
+    design_score = inverse_ratio(err_count / max(gt_entry.n_elements, 1))
     blank_score = inverse_ratio(blank_ratio)
 
 
-    gpt_labels, gpt_json_path = gpt_extract_labels(png_path, out_dir)
-
-
-    readability_score, read_pred_norm, read_ref_norm = readability_precision(gpt_labels, pdf_labels_raw)
+    readability_score, read_pred_norm, read_ref_norm = readability_precision(gpt_labels, pdf_labels_raw,
+                                                                             pdf_tokens, pdf_counter)
 
 
-    align_score = alignment_score(grid_png)
+    align_score = metrics["align"]
 
-    weight_table = {
-        "precision": 0.2,
-        "recall":    0.2,
-        "design":    0.2,
-        "blank":     0.05,
-        "read":      0.25,  
-        "align":     0.1,
-    }
+    weight_table = WEIGHT_TABLE
     final_raw = (
         precision_text * weight_table["precision"] +
         recall_text    * weight_table["recall"]    +
@@ -355,6 +1123,7 @@ def evaluate_single_pdf(pdf_path: Path, gt_prompt_path: Path, out_dir: Path) ->
         "precision":   round(precision_text, 4),
         "recall":      round(recall_text, 4),
         "design_errs": err_count,
+        "gt_elements": gt_entry.n_elements,
         "design_score":round(design_score, 4),
         "blank_ratio": round(blank_ratio, 4),
         "blank_score": round(blank_score, 4),
@@ -363,10 +1132,11 @@ def evaluate_single_pdf(pdf_path: Path, gt_prompt_path: Path, out_dir: Path) ->
         "step":  step_number,
         "final_raw":   round(final_raw, 4),
         "final":       round(final_score, 4),
+        "blank_metric": BLANK_METRIC,
 
-        "text_json": str(text_json_path.name),
-        "png":       str(png_path.name),
-        "grid_png":  str(grid_png.name),
+        "text_json": prepared["text_json"],
+        "png":       png_path.name if png_path else None,
+        "grid_png":  grid_png.name if grid_png else None,
         "gpt_json":  str(gpt_json_path.name),
 
         "design_analysis": err_analysis,
@@ -376,11 +1146,30 @@ def evaluate_single_pdf(pdf_path: Path, gt_prompt_path: Path, out_dir: Path) ->
         "gt_norm":  gt_tokens   
     }
 
+    if use_local_blank:
+        result_dict["align_proj"] = round(metrics["align_proj"], 4)
+
+    if timings is not None:
+        # Queue wait between the two stages is not counted in "total".
+        timings["score"] = time.perf_counter() - started
+        timings["total"] = timings.get("prepare", 0.0) + timings["score"]
+        result_dict["timings"] = {k: round(v, 4) for k, v in sorted(timings.items())}
+
     score_json_path = out_dir / f"{pdf_path.stem}_score.json"
     score_json_path.write_text(json.dumps(result_dict,
                                           ensure_ascii=False, indent=2), "utf-8")
     return score_json_path
 
+def evaluate_single_pdf(pdf_path: Path, gt_prompt_path: Path, out_dir: Path,
+                        keep_artifacts: bool = False,
+                        gt_index: Optional[GTIndex] = None) -> Path:
+
+    ensure_out_dir(out_dir)
+
+    gt_entry = gt_index.get(gt_prompt_path) if gt_index is not None else load_gt_entry(gt_prompt_path)
+    prepared = prepare_pdf(pdf_path, out_dir)
+    return run_vlm(score_prepared_pdf(pdf_path, prepared, gt_entry, out_dir, keep_artifacts))
+
 def main_single_cli():
     parser = argparse.ArgumentParser(
         description="Single PDF scientific research drawing evaluation (Automatically generate all intermediate files and output the final score.json)）"
@@ -417,88 +1206,921 @@ def parse_pdf_filename(pdf_name: str) -> Tuple[str, str]:
         raise ValueError(f"Unable to parse pdf file name: {pdf_name}")
     return m.group(1), m.group(2)
 
-def evaluate_batch(pdf_dir: Path,
-                   gt_dir:  Path,
-                   out_dir: Path) -> Path:
-
-    ensure_out_dir(out_dir)
+SUMMARY_FIELDS = [
+    "precision", "recall", "design_score", "blank_score",
+    "readability", "align", "step", "final_raw", "final"
+]
+SUMMARY_FLUSH_SECONDS = 10.0
+
+def scoring_config() -> Dict:
+
+    return {
+        "model":       AZURE_MODEL_NAME,
+        "weights":     WEIGHT_TABLE,
+        "dpi":         RENDER_DPI,
+        "grid_size":   GRID_SIZE,
+        "blank":       [BLANK_METRIC, BLANK_INK_LEVEL, BLANK_CELL_INK],
+        "text_words":  TEXT_FALLBACK_WORDS,
+        "image":       [IMAGE_FORMAT, IMAGE_QUALITY, IMAGE_MAX_EDGE],
+        "step_K":      STEP_K,
+        "bonus_ratio": STEP_BONUS_RATIO,
+    }
 
-    pdf_files = sorted(pdf_dir.glob("*.pdf"))
-    results: List[Dict] = []
-    skipped: List[str] = []
+def input_fingerprint(pdf_path: Path, gt_path: Path) -> str:
+
+    h = hashlib.sha256()
+    h.update(pdf_path.read_bytes())
+    h.update(b"\0")
+    h.update(gt_path.read_bytes())
+    h.update(b"\0")
+    h.update(json.dumps(scoring_config(), sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+class ManifestIndex:
+
+    # manifest.jsonl mirrored into SQLite, so entries are looked up by file name
+    # on demand instead of the whole manifest being held in memory. Only lines
+    # appended since the last sync are read.
+    SYNC_CHUNK = 10000
+
+    @staticmethod
+    def db_path_for(manifest_path: Path) -> Path:
+        return manifest_path.with_suffix(".sqlite")
+
+    def __init__(self, manifest_path: Path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path_for(manifest_path), check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS manifest (file TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._sync(manifest_path)
+
+    def _sync(self, manifest_path: Path):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'offset'").fetchone()
+        offset = row[0] if row else 0
+        size = manifest_path.stat().st_size if manifest_path.exists() else 0
+        if offset > size:
+            # The manifest was replaced; rebuild from scratch.
+            self._conn.execute("DELETE FROM manifest")
+            offset = 0
+        if offset < size:
+            rows = []
+            with manifest_path.open("rb") as fp:
+                fp.seek(offset)
+                for line in fp:
+                    offset += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash can leave a truncated last line behind.
+                        continue
+                    rows.append((entry["file"], json.dumps(entry, ensure_ascii=False)))
+                    if len(rows) >= self.SYNC_CHUNK:
+                        self._conn.executemany("INSERT OR REPLACE INTO manifest VALUES (?, ?)", rows)
+                        rows = []
+            self._conn.executemany("INSERT OR REPLACE INTO manifest VALUES (?, ?)", rows)
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('offset', ?)", (offset,))
+        self._conn.commit()
+
+    def get(self, name: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT entry FROM manifest WHERE file = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class BatchJob(NamedTuple):
+    pdf_path:     Path
+    gt_path:      Path
+    algo_out_dir: Path
+    fingerprint:  str
+
+BatchOutcome = Tuple[str, Optional[Dict], Optional[Dict]]
+
+def _resolve_batch_item(pdf_path: Path, gt_dir: Path, out_dir: Path,
+                        manifest: ManifestIndex) -> Union[BatchJob, BatchOutcome]:
+
+    try:
+        prefix, algo_name = parse_pdf_filename(pdf_path.name)
+    except ValueError:
+        print(f"Skip files that cannot be parsed: {pdf_path.name}")
+        return pdf_path.name, None, None
+
+    gt_path = gt_dir / f"{prefix}.json"
+    if not gt_path.exists():
+        print(f"Could not find a matching GT: {gt_path.name}, skip {pdf_path.name}")
+        return pdf_path.name, None, None
+
+    try:
+        fingerprint = input_fingerprint(pdf_path, gt_path)
+        entry = manifest.get(pdf_path.name)
+        if entry is not None and entry["fingerprint"] == fingerprint:
+            score_json_path = out_dir / entry["score_json"]
+            if score_json_path.exists():
+                print(f"Unchanged, reuse: {pdf_path.name}")
+                return pdf_path.name, json.loads(score_json_path.read_text("utf-8")), None
+    except Exception as e:
+        print(f"Evaluation failed {pdf_path.name}: {e}")
+        return pdf_path.name, None, None
+
+    return BatchJob(pdf_path, gt_path, out_dir / algo_name, fingerprint)
+
+def _finish_batch_job(job: BatchJob, out_dir: Path, score_json_path: Path) -> BatchOutcome:
+
+    result = json.loads(score_json_path.read_text("utf-8"))
+    print(f"Finish: {job.pdf_path.name}")
+    entry = {
+        "file":        job.pdf_path.name,
+        "fingerprint": job.fingerprint,
+        "score_json":  score_json_path.relative_to(out_dir).as_posix(),
+    }
+    return job.pdf_path.name, result, entry
+
+def _evaluate_batch_item(pdf_path: Path, gt_dir: Path, out_dir: Path,
+                         manifest: ManifestIndex,
+                         keep_artifacts: bool = False,
+                         gt_index: Optional[GTIndex] = None) -> BatchOutcome:
+
+    job = _resolve_batch_item(pdf_path, gt_dir, out_dir, manifest)
+    if not isinstance(job, BatchJob):
+        return job
+    try:
+        score_json_path = evaluate_single_pdf(job.pdf_path, job.gt_path, job.algo_out_dir,
+                                              keep_artifacts, gt_index)
+        return _finish_batch_job(job, out_dir, score_json_path)
+    except Exception as e:
+        print(f"Evaluation failed {pdf_path.name}: {e}")
+        return pdf_path.name, None, None
+
+PIPELINE_LOG_SECONDS = 10.0
+
+def _render_worker_config() -> Dict:
+
+    return {
+        "RENDER_DPI":          RENDER_DPI,
+        "TEXT_FALLBACK_WORDS": TEXT_FALLBACK_WORDS,
+        "DOC_CACHE_MB":        DOC_CACHE_MB,
+        "STAGE_TIMINGS":       STAGE_TIMINGS,
+    }
 
-    for pdf_path in pdf_files:
+def _init_render_worker(config: Dict):
+
+    # Worker processes may be spawned rather than forked (Windows), so the
+    # CLI settings that affect the render stage are passed in explicitly.
+    globals().update(config)
+    configure_doc_cache(config["DOC_CACHE_MB"])
+
+async def _pipeline_async(jobs: List[Tuple[int, BatchJob]], record, out_dir: Path,
+                          render_procs: int, consumers: int, queue_size: int,
+                          keep_artifacts: bool, gt_index: GTIndex):
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+    stats = {"rendered": 0, "scored": 0}
+    total = len(jobs)
+    started = time.monotonic()
+
+    async def monitor():
+        while True:
+            await asyncio.sleep(PIPELINE_LOG_SECONDS)
+            elapsed = time.monotonic() - started
+            print(f"[pipeline] rendered {stats['rendered']}/{total} ({stats['rendered'] / elapsed:.2f}/s) | "
+                  f"scored {stats['scored']}/{total} ({stats['scored'] / elapsed:.2f}/s) | "
+                  f"queue {queue.qsize()}/{queue.maxsize}")
+
+    with ProcessPoolExecutor(max_workers=render_procs, initializer=_init_render_worker,
+                             initargs=(_render_worker_config(),)) as pool:
+
+        slots = asyncio.Semaphore(render_procs)
+
+        async def render_one(idx: int, job: BatchJob):
+            try:
+                try:
+                    prepared = await loop.run_in_executor(pool, prepare_pdf, job.pdf_path, job.algo_out_dir)
+                    item = (idx, job, prepared, None)
+                except Exception as e:
+                    item = (idx, job, None, e)
+                stats["rendered"] += 1
+                # The slot is only released once the page is queued, so a full
+                # queue stops new renders (backpressure) instead of piling up.
+                await queue.put(item)
+            finally:
+                slots.release()
+
+        async def produce():
+            tasks = []
+            for idx, job in jobs:
+                await slots.acquire()
+                tasks.append(asyncio.create_task(render_one(idx, job)))
+            await asyncio.gather(*tasks)
+            for _ in range(consumers):
+                await queue.put(None)
+
+        async def consume():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                idx, job, prepared, err = item
+                try:
+                    if err is not None:
+                        raise err
+                    gt_entry = await asyncio.to_thread(gt_index.get, job.gt_path)
+                    score_json_path = await score_prepared_pdf(
+                        job.pdf_path, prepared, gt_entry, job.algo_out_dir, keep_artifacts)
+                    outcome = _finish_batch_job(job, out_dir, score_json_path)
+                except Exception as e:
+                    print(f"Evaluation failed {job.pdf_path.name}: {e}")
+                    outcome = (job.pdf_path.name, None, None)
+                stats["scored"] += 1
+                record(idx, outcome)
+
+        monitor_task = asyncio.create_task(monitor())
+        try:
+            await asyncio.gather(produce(), *(consume() for _ in range(consumers)))
+        finally:
+            monitor_task.cancel()
+
+    elapsed = max(time.monotonic() - started, 1e-9)
+    print(f"[pipeline] done: {total} PDFs in {elapsed:.1f}s ({total / elapsed:.2f}/s)")
+
+def timing_stats(results: List[Dict]) -> Dict[str, Dict[str, float]]:
+
+    per_stage: Dict[str, List[float]] = {}
+    for r in results:
+        for stage, seconds in (r.get("timings") or {}).items():
+            per_stage.setdefault(stage, []).append(seconds)
+    stats = {}
+    for stage, values in sorted(per_stage.items()):
+        arr = np.asarray(values, dtype=np.float64)
+        stats[stage] = {
+            "count": int(arr.size),
+            "p50":   round(float(np.percentile(arr, 50)), 4),
+            "p95":   round(float(np.percentile(arr, 95)), 4),
+            "max":   round(float(arr.max()), 4),
+        }
+    return stats
+
+def profile_pdfs(pdf_paths: List[Path], prof_dir: Path) -> List[Path]:
+
+    # cProfile only sees the thread it runs in, while the judges run on the
+    # shared event loop, so the local (CPU) path of each PDF is replayed here
+    # without model calls. Judge latency is covered by the stage timings.
+    global _DOC_CACHE
+    ensure_out_dir(prof_dir)
+    written: List[Path] = []
+    doc_cache, _DOC_CACHE = _DOC_CACHE, None
+    try:
+        for pdf_path in pdf_paths:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                prepared = prepare_pdf(pdf_path, prof_dir)
+                grid_arr = add_grid_to_array(prepared["page"])
+                _page_metrics(prepared["page"], grid_arr)
+                image_data_url(prepared["page"])
+                image_data_url(grid_arr)
+            finally:
+                profiler.disable()
+            prof_path = prof_dir / f"{pdf_path.stem}.prof"
+            profiler.dump_stats(str(prof_path))
+            with (prof_dir / f"{pdf_path.stem}_profile.txt").open("w", encoding="utf-8") as fp:
+                pstats.Stats(profiler, stream=fp).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCS)
+            written.append(prof_path)
+    finally:
+        _DOC_CACHE = doc_cache
+    return written
+
+# Long per-PDF fields kept out of summary.json and the results table.
+RESULT_TEXT_FIELDS = ["design_analysis", "pdf_norm", "read_norm", "gt_norm"]
+RESULTS_TABLE = "results"
+TEXT_DETAILS  = "details_text.jsonl"
+
+def lean_result(result: Dict) -> Dict:
+
+    return {k: v for k, v in result.items() if k not in RESULT_TEXT_FIELDS and k != "timings"}
+
+def results_frame(results: List[Dict]) -> pd.DataFrame:
+
+    rows = []
+    for r in results:
+        row = lean_result(r)
         try:
-            prefix, algo_name = parse_pdf_filename(pdf_path.name)
+            prefix, algo = parse_pdf_filename(r["file"])
         except ValueError:
-            print(f"Skip files that cannot be parsed: {pdf_path.name}")
-            skipped.append(pdf_path.name)
-            continue
+            prefix, algo = "", ""
+        row["algo"]  = algo
+        row["split"] = prefix.split("_")[0].lower()
+        for stage, seconds in (r.get("timings") or {}).items():
+            row[f"timing_{stage}"] = seconds
+        rows.append(row)
+    return pd.DataFrame(rows, columns=None if rows else ["file", "algo", "split", *SUMMARY_FIELDS])
+
+def aggregate_results(df: pd.DataFrame) -> Tuple[Dict[str, float], Dict[str, Dict]]:
+
+    if df.empty:
+        return {f"avg_{f}": 0.0 for f in SUMMARY_FIELDS}, {}
+
+    means = df[SUMMARY_FIELDS].mean().round(4)
+    avg_dict = {f"avg_{f}": float(means[f]) for f in SUMMARY_FIELDS}
+
+    grouped = df.groupby("algo", sort=True)[SUMMARY_FIELDS]
+    algo_means = grouped.mean().round(4)
+    counts = grouped.size()
+    by_algo = {
+        algo: {"count": int(counts[algo]), **{f"avg_{f}": float(row[f]) for f in SUMMARY_FIELDS}}
+        for algo, row in algo_means.iterrows()
+    }
+    return avg_dict, by_algo
+
+def write_results_table(df: pd.DataFrame, summary_dir: Path, name: str = RESULTS_TABLE) -> Path:
+
+    # Parquet needs pyarrow or fastparquet; without either the same columns go to CSV.
+    path = summary_dir / f"{name}.parquet"
+    tmp_path = path.with_suffix(".parquet.tmp")
+    try:
+        df.to_parquet(tmp_path, index=False)
+    except ImportError:
+        path = summary_dir / f"{name}.csv"
+        tmp_path = path.with_suffix(".csv.tmp")
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+def results_table_paths(summary_dir: Path) -> List[Path]:
+
+    return [summary_dir / f"{RESULTS_TABLE}.parquet", summary_dir / f"{RESULTS_TABLE}.csv"]
+
+def load_results_table(summary_dir: Path) -> pd.DataFrame:
+
+    parquet_path, csv_path = results_table_paths(summary_dir)
+    if parquet_path.exists():
+        return pd.read_parquet(parquet_path)
+    return pd.read_csv(csv_path)
 
-        gt_path = gt_dir / f"{prefix}.json"
-        if not gt_path.exists():
-            print(f"Could not find a matching GT: {gt_path.name}, skip {pdf_path.name}")
-            skipped.append(pdf_path.name)
+def write_summary(out_dir: Path, total_pdf: int,
+                  outcomes: List[Optional[Tuple[str, Optional[Dict]]]]) -> Tuple[Path, Dict[str, float]]:
+
+    results: List[Dict] = []
+    skipped: List[str] = []
+    for outcome in outcomes:
+        if outcome is None:
             continue
+        name, result = outcome
+        if result is None:
+            skipped.append(name)
+        else:
+            results.append(result)
 
-        algo_out_dir = out_dir / algo_name
-        try:
-            score_json_path = evaluate_single_pdf(pdf_path, gt_path, algo_out_dir)
-            results.append(json.loads(score_json_path.read_text("utf-8")))
-            print(f"Finish: {pdf_path.name}")
-        except Exception as e:
-            print(f"Evaluation failed {pdf_path.name}: {e}")
-            skipped.append(pdf_path.name)
-
-    if results:
-\
-        fields = [
-            "precision", "recall", "design_score", "blank_score",
-            "readability", "align", "step", "final_raw", "final"
-        ]
-        avg_dict: Dict[str, float] = {
-            f"avg_{f}": round(sum(r[f] for r in results) / len(results), 4)
-            for f in fields
-        }
-        avg_final_score = avg_dict["avg_final"]
-    else:
-        avg_dict = {f"avg_{f}": 0.0 for f in [
-            "precision", "recall", "design_score", "blank_score",
-            "readability", "align", "step", "final_raw", "final"
-        ]}
-        avg_final_score = 0.0
+    summary_dir = out_dir / "summary"       
+    ensure_out_dir(summary_dir)             
+
+    df = results_frame(results)
+    avg_dict, by_algo = aggregate_results(df)
+    table_path = write_results_table(df, summary_dir)
+
+    text_path = summary_dir / TEXT_DETAILS
+    tmp_path = text_path.with_suffix(".jsonl.tmp")
+    with tmp_path.open("w", encoding="utf-8") as fp:
+        for r in results:
+            fp.write(json.dumps({"file": r["file"], **{k: r.get(k) for k in RESULT_TEXT_FIELDS}},
+                                ensure_ascii=False) + "\n")
+    os.replace(tmp_path, text_path)
 
     summary = {
-        "total_pdf": len(pdf_files),
+        "total_pdf": total_pdf,
         "evaluated": len(results),
         "skipped":   skipped,
         **avg_dict,            
-        "details":   results,
+        "by_algo":   by_algo,
     }
+    stage_stats = timing_stats(results)
+    if stage_stats:
+        summary["timings"] = stage_stats
+    summary["results_table"] = table_path.name
+    summary["text_details"]  = text_path.name
+    summary["details"] = [lean_result(r) for r in results]
 
-    summary_dir = out_dir / "summary"       
-    ensure_out_dir(summary_dir)             
     summary_path = summary_dir / "summary.json" 
-    summary_path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), "utf-8")
+    tmp_path = summary_path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), "utf-8")
+    os.replace(tmp_path, summary_path)
+    return summary_path, avg_dict
+
+def evaluate_batch(pdf_dir: Path,
+                   gt_dir:  Path,
+                   out_dir: Path,
+                   workers: int = 1,
+                   resume:  bool = True,
+                   keep_artifacts: bool = False,
+                   render_procs: int = 0,
+                   queue_size: int = 8,
+                   profile_top: int = 0) -> Path:
+
+    reset_run_stats()
+    ensure_out_dir(out_dir)
+    ensure_out_dir(out_dir / "summary")
+
+    pdf_files = sorted(pdf_dir.glob("*.pdf"))
+    manifest_path = out_dir / "summary" / "manifest.jsonl"
+    if not resume:
+        for path in (manifest_path, ManifestIndex.db_path_for(manifest_path)):
+            if path.exists():
+                path.unlink()
+    manifest = ManifestIndex(manifest_path)
+
+    # GT files are parsed and tokenized once per batch and shared by every
+    # algorithm's PDF for the same prompt.
+    gt_index = GTIndex()
+
+    # Slots are filled in input order as results stream in, so partial and final
+    # summaries keep the same deterministic ordering as a serial run.
+    outcomes: List[Optional[Tuple[str, Optional[Dict]]]] = [None] * len(pdf_files)
+    last_flush = time.monotonic()
+
+    with manifest_path.open("a", encoding="utf-8") as manifest_fp:
+
+        def record(idx: int, item: Tuple[str, Optional[Dict], Optional[Dict]]):
+            nonlocal last_flush
+            name, result, entry = item
+            outcomes[idx] = (name, result)
+            if entry is not None:
+                manifest_fp.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                manifest_fp.flush()
+            if time.monotonic() - last_flush >= SUMMARY_FLUSH_SECONDS:
+                write_summary(out_dir, len(pdf_files), outcomes)
+                last_flush = time.monotonic()
+
+        if render_procs > 0:
+            # Two-stage pipeline: a process pool rasterizes and extracts text,
+            # a bounded queue feeds `workers` async scorers that call the judges.
+            jobs: List[Tuple[int, BatchJob]] = []
+            for idx, p in enumerate(pdf_files):
+                item = _resolve_batch_item(p, gt_dir, out_dir, manifest)
+                if isinstance(item, BatchJob):
+                    jobs.append((idx, item))
+                else:
+                    record(idx, item)
+            if jobs:
+                # Outcomes are handed back and recorded on this thread, so the
+                # manifest writes and summary flushes never block the VLM loop.
+                done: SimpleQueue = SimpleQueue()
+                fut = asyncio.run_coroutine_threadsafe(
+                    _pipeline_async(jobs, lambda idx, outcome: done.put((idx, outcome)), out_dir,
+                                    render_procs, max(1, workers), queue_size, keep_artifacts, gt_index),
+                    _vlm_loop())
+                while not (fut.done() and done.empty()):
+                    try:
+                        record(*done.get(timeout=0.5))
+                    except Empty:
+                        pass
+                fut.result()
+        elif workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(_evaluate_batch_item, p, gt_dir, out_dir, manifest,
+                                keep_artifacts, gt_index): idx
+                    for idx, p in enumerate(pdf_files)
+                }
+                for fut in as_completed(futures):
+                    record(futures[fut], fut.result())
+        else:
+            for idx, p in enumerate(pdf_files):
+                record(idx, _evaluate_batch_item(p, gt_dir, out_dir, manifest, keep_artifacts, gt_index))
+
+    manifest.close()
+    summary_path, avg_dict = write_summary(out_dir, len(pdf_files), outcomes)
+
+    if profile_top > 0:
+        timed = [r for _, r in filter(None, outcomes) if r is not None and r.get("timings")]
+        slowest = sorted(timed, key=lambda r: r["timings"].get("total", 0.0), reverse=True)[:profile_top]
+        _profile_slowest(pdf_dir, out_dir, [r["file"] for r in slowest])
+    _report_batch(avg_dict, summary_path)
+    return summary_path
+
+def _profile_slowest(pdf_dir: Path, out_dir: Path, names: List[str]):
 
+    prof_paths = profile_pdfs([pdf_dir / name for name in names], out_dir / "summary" / "profiles")
+    print(f"cProfile stats of the {len(prof_paths)} slowest PDFs: {out_dir / 'summary' / 'profiles'}")
+
+def _report_batch(avg_dict: Dict[str, float], summary_path: Path):
+
+    avg_final_score = avg_dict["avg_final"]
 
     print("\n================== Batch evaluation completed ==================")
     print("Average metrics (successfully evaluated files)")
-    for fld in [
-        "precision", "recall", "design_score", "blank_score",
-        "readability", "align", "step", "final_raw", "final"
-    ]:
+    for fld in SUMMARY_FIELDS:
         print(f"  {fld:<12}: {avg_dict[f'avg_{fld}']}")
     print(f"Average final score (avg_final): {avg_final_score}")
+    if _RESPONSE_CACHE is not None:
+        cache_stats = _RESPONSE_CACHE.stats()
+        print(f"VLM response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    sched = scheduler_stats()
+    print(f"Judge scheduler: {sched['retries']} retries ({sched['rate_limited']} rate-limited), "
+          f"{sched['throttled_seconds']:.1f}s throttled")
+    sent = payload_stats()
+    print(f"Image payload sent: {sent['calls']} calls, "
+          f"{sent['avg_bytes'] / 1024:.1f} KB/call, {sent['image_bytes'] / 1024 / 1024:.2f} MB total")
     print(f"Detailed results are written to: {summary_path}")
+
+# Welford mean/variance accumulator, updated one value at a time.
+class RunningStats:
+
+    __slots__ = ("count", "mean", "m2", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean  = 0.0
+        self.m2    = 0.0
+        self.max   = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        self.max = max(self.max, value)
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def ci95(self) -> float:
+        # Normal approximation of the 95% confidence half-width of the mean.
+        return 1.96 * math.sqrt(self.variance / self.count) if self.count > 1 else 0.0
+
+STREAM_RESULTS = "results.jsonl"
+STREAM_SKIPPED = "skipped.txt"
+STREAM_SKIPPED_LISTED = 1000    # skipped names kept in summary.json; all of them go to skipped.txt
+
+def iter_pdf_files(pdf_dir: Path) -> Iterator[Path]:
+
+    # Directory order, no sorting: nothing is materialized up front.
+    with os.scandir(pdf_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".pdf") and entry.is_file():
+                yield Path(entry.path)
+
+# Running per-field statistics of a streamed batch, overall and per algorithm.
+class StreamAggregate:
+
+    def __init__(self, profile_top: int = 0):
+        self.seen      = 0
+        self.skipped   = 0
+        self.skipped_names: List[str] = []
+        self.overall   = {f: RunningStats() for f in SUMMARY_FIELDS}
+        self.by_algo: Dict[str, Dict[str, RunningStats]] = {}
+        self.timings: Dict[str, RunningStats] = {}
+        self.profile_top = profile_top
+        self.slowest: List[Tuple[float, str]] = []     # min-heap of the slowest PDFs
+
+    def skip(self, name: str):
+        self.skipped += 1
+        if len(self.skipped_names) < STREAM_SKIPPED_LISTED:
+            self.skipped_names.append(name)
+
+    def add(self, result: Dict):
+        try:
+            algo = parse_pdf_filename(result["file"])[1]
+        except ValueError:
+            algo = ""
+        algo_stats = self.by_algo.setdefault(algo, {f: RunningStats() for f in SUMMARY_FIELDS})
+        for f in SUMMARY_FIELDS:
+            self.overall[f].add(float(result[f]))
+            algo_stats[f].add(float(result[f]))
+        for stage, seconds in (result.get("timings") or {}).items():
+            self.timings.setdefault(stage, RunningStats()).add(seconds)
+        if self.profile_top > 0 and result.get("timings"):
+            item = (result["timings"].get("total", 0.0), result["file"])
+            if len(self.slowest) < self.profile_top:
+                heapq.heappush(self.slowest, item)
+            else:
+                heapq.heappushpop(self.slowest, item)
+
+    def summary(self) -> Dict:
+        evaluated = self.overall["final"].count
+        summary = {
+            "total_pdf": self.seen,
+            "evaluated": evaluated,
+            "skipped":   list(self.skipped_names),
+            "skipped_count": self.skipped,
+            **{f"avg_{f}": round(self.overall[f].mean, 4) for f in SUMMARY_FIELDS},
+            "std":       {f: round(math.sqrt(self.overall[f].variance), 4) for f in SUMMARY_FIELDS},
+            "by_algo":   {
+                algo: {"count": stats["final"].count,
+                       **{f"avg_{f}": round(stats[f].mean, 4) for f in SUMMARY_FIELDS}}
+                for algo, stats in sorted(self.by_algo.items())
+            },
+        }
+        if self.timings:
+            summary["timings"] = {
+                stage: {"count": st.count, "mean": round(st.mean, 4),
+                        "std": round(math.sqrt(st.variance), 4), "max": round(st.max, 4)}
+                for stage, st in sorted(self.timings.items())
+            }
+        summary["results_table"] = STREAM_RESULTS
+        summary["text_details"]  = TEXT_DETAILS
+        summary["skipped_files"] = STREAM_SKIPPED
+        return summary
+
+def write_stream_summary(out_dir: Path, agg: StreamAggregate) -> Tuple[Path, Dict[str, float]]:
+
+    summary = agg.summary()
+    summary_path = out_dir / "summary" / "summary.json"
+    tmp_path = summary_path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), "utf-8")
+    os.replace(tmp_path, summary_path)
+    return summary_path, {f"avg_{f}": summary[f"avg_{f}"] for f in SUMMARY_FIELDS}
+
+def evaluate_batch_stream(pdf_dir: Path,
+                          gt_dir:  Path,
+                          out_dir: Path,
+                          workers: int = 1,
+                          resume:  bool = True,
+                          keep_artifacts: bool = False,
+                          profile_top: int = 0) -> Path:
+
+    # Memory-bounded variant of evaluate_batch: PDFs are visited lazily with at
+    # most 2 x workers in flight, every result is appended to disk as soon as it
+    # arrives, and only running aggregates stay in memory. The manifest is
+    # looked up through SQLite instead of being loaded.
+    reset_run_stats()
+    summary_dir = out_dir / "summary"
+    ensure_out_dir(summary_dir)
+
+    manifest_path = summary_dir / "manifest.jsonl"
+    if not resume:
+        for path in (manifest_path, ManifestIndex.db_path_for(manifest_path)):
+            if path.exists():
+                path.unlink()
+    manifest = ManifestIndex(manifest_path)
+    # A results table from an earlier evaluate_batch run would describe other scores.
+    for path in results_table_paths(summary_dir):
+        if path.exists():
+            path.unlink()
+
+    gt_index = GTIndex()
+    agg = StreamAggregate(profile_top)
+    last_flush = time.monotonic()
+
+    with manifest_path.open("a", encoding="utf-8") as manifest_fp, \
+         (summary_dir / STREAM_RESULTS).open("w", encoding="utf-8") as results_fp, \
+         (summary_dir / TEXT_DETAILS).open("w", encoding="utf-8") as text_fp, \
+         (summary_dir / STREAM_SKIPPED).open("w", encoding="utf-8") as skipped_fp:
+
+        def record(item: BatchOutcome):
+            nonlocal last_flush
+            name, result, entry = item
+            agg.seen += 1
+            if result is None:
+                agg.skip(name)
+                skipped_fp.write(name + "\n")
+            else:
+                agg.add(result)
+                results_fp.write(json.dumps(lean_result(result), ensure_ascii=False) + "\n")
+                text_fp.write(json.dumps({"file": result["file"], **{k: result.get(k) for k in RESULT_TEXT_FIELDS}},
+                                         ensure_ascii=False) + "\n")
+            if entry is not None:
+                manifest_fp.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                manifest_fp.flush()
+            if time.monotonic() - last_flush >= SUMMARY_FLUSH_SECONDS:
+                for fp in (results_fp, text_fp, skipped_fp):
+                    fp.flush()
+                write_stream_summary(out_dir, agg)
+                last_flush = time.monotonic()
+
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                pending = set()
+                for p in iter_pdf_files(pdf_dir):
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for fut in done:
+                            record(fut.result())
+                    pending.add(pool.submit(_evaluate_batch_item, p, gt_dir, out_dir, manifest,
+                                            keep_artifacts, gt_index))
+                for fut in as_completed(pending):
+                    record(fut.result())
+        else:
+            for p in iter_pdf_files(pdf_dir):
+                record(_evaluate_batch_item(p, gt_dir, out_dir, manifest, keep_artifacts, gt_index))
+
+    manifest.close()
+    summary_path, avg_dict = write_stream_summary(out_dir, agg)
+    if profile_top > 0:
+        _profile_slowest(pdf_dir, out_dir, [name for _, name in sorted(agg.slowest, reverse=True)])
+    _report_batch(avg_dict, summary_path)
     return summary_path
 
+
+LEADERBOARD_FIELDS = [f for f in SUMMARY_FIELDS if f != "step"]
+STEP_BUCKETS = [10, 25, 50, 100]
+
+def step_bucket(step: int, edges: List[int] = STEP_BUCKETS) -> Tuple[int, str]:
+
+    i = bisect.bisect_right(edges, step)
+    if i == 0:
+        return i, f"<{edges[0]}"
+    if i == len(edges):
+        return i, f">={edges[-1]}"
+    return i, f"{edges[i - 1]}-{edges[i] - 1}"
+
+def iter_score_files(root: Path) -> Iterator[Path]:
+
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith("_score.json"):
+                yield Path(dirpath) / name
+
+def build_leaderboard(results_dir: Path, edges: List[int] = STEP_BUCKETS) -> List[Dict]:
+
+    # One streaming pass over every *_score.json under results_dir, grouped by
+    # split (t2i/ti2i) x step bucket x algorithm; nothing is re-evaluated.
+    groups: Dict[Tuple[str, Tuple[int, str], str], Dict[str, RunningStats]] = {}
+    for score_path in iter_score_files(results_dir):
+        try:
+            result = json.loads(score_path.read_text("utf-8"))
+            prefix, algo = parse_pdf_filename(result["file"])
+        except (ValueError, KeyError) as e:
+            print(f"Skip unreadable result {score_path}: {e}")
+            continue
+        key = (prefix.split("_")[0].lower(), step_bucket(int(result["step"]), edges), algo)
+        stats = groups.setdefault(key, {f: RunningStats() for f in LEADERBOARD_FIELDS})
+        for f in LEADERBOARD_FIELDS:
+            stats[f].add(float(result[f]))
+
+    # Within a split and step bucket, algorithms are ranked by mean final score.
+    ordered = sorted(groups.items(), key=lambda kv: (kv[0][0], kv[0][1][0], -kv[1]["final"].mean, kv[0][2]))
+    rows = []
+    for (split, (_, bucket), algo), stats in ordered:
+        row = {"algo": algo, "split": split, "steps": bucket, "count": stats["final"].count}
+        for f in LEADERBOARD_FIELDS:
+            row[f] = {"mean": round(stats[f].mean, 4), "ci95": round(stats[f].ci95(), 4)}
+        rows.append(row)
+    return rows
+
+def write_leaderboard(results_dir: Path, edges: List[int] = STEP_BUCKETS) -> Path:
+
+    rows = build_leaderboard(results_dir, edges)
+    summary_dir = results_dir / "summary"
+    ensure_out_dir(summary_dir)
+    board_path = summary_dir / "leaderboard.json"
+    tmp_path = board_path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps({"step_buckets": edges, "rows": rows}, ensure_ascii=False, indent=2), "utf-8")
+    os.replace(tmp_path, board_path)
+
+    print(f"{'split':<6} {'steps':<8} {'algo':<20} {'n':>5}  {'final':>16}  {'final_raw':>16}")
+    for r in rows:
+        print(f"{r['split']:<6} {r['steps']:<8} {r['algo']:<20} {r['count']:>5}  "
+              f"{r['final']['mean']:.4f} ± {r['final']['ci95']:.4f}  "
+              f"{r['final_raw']['mean']:.4f} ± {r['final_raw']['ci95']:.4f}")
+    print(f"Leaderboard written to: {board_path}")
+    return board_path
+
+RESCORE_TABLE = "rescore"
+
+def load_score_frame(results_dir: Path) -> pd.DataFrame:
+
+    # The columnar table from write_summary is only trusted when it was written
+    # after the newest *_score.json and has one row per file; any later run
+    # into the same outdir makes it stale, and then the files are parsed.
+    score_paths = list(iter_score_files(results_dir))
+    table_path = next((p for p in results_table_paths(results_dir / "summary") if p.exists()), None)
+    if table_path is not None:
+        newest = max((p.stat().st_mtime_ns for p in score_paths), default=0)
+        if table_path.stat().st_mtime_ns >= newest:
+            df = load_results_table(results_dir / "summary")
+            if len(df) == len(score_paths):
+                df[["algo", "split"]] = df[["algo", "split"]].fillna("")
+                return df
+
+    def results():
+        for score_path in score_paths:
+            try:
+                yield json.loads(score_path.read_text("utf-8"))
+            except ValueError as e:
+                print(f"Skip unreadable result {score_path}: {e}")
+
+    return results_frame(results())
+
+def expand_rescore_grid(spec: Union[Dict, List[Dict]]) -> List[Dict]:
+
+    # Either a list of settings or a dict of value lists whose cartesian
+    # product is taken, e.g. {"weights.read": [0.2, 0.3], "step_K": [25, 50]}.
+    if isinstance(spec, list):
+        return spec
+    keys = list(spec)
+    settings = []
+    for values in itertools.product(*(spec[k] for k in keys)):
+        setting: Dict = {"weights": {}}
+        for key, value in zip(keys, values):
+            if key.startswith("weights."):
+                setting["weights"][key.split(".", 1)[1]] = value
+            else:
+                setting[key] = value
+        settings.append(setting)
+    return settings
+
+def resolve_rescore_setting(setting: Dict) -> Dict:
+
+    unknown = set(setting.get("weights", {})) - set(WEIGHT_TABLE)
+    if unknown:
+        raise ValueError(f"Unknown weight(s): {sorted(unknown)}")
+    return {
+        "weights":     {**WEIGHT_TABLE, **setting.get("weights", {})},
+        "step_K":      float(setting.get("step_K", STEP_K)),
+        "bonus_ratio": float(setting.get("bonus_ratio", STEP_BONUS_RATIO)),
+        "max_fail":    float(setting.get("max_fail", 1.0)),
+    }
+
+def rescore_arrays(df: pd.DataFrame, settings: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+
+    # final_raw and final for every (setting, PDF) pair at once, both shaped
+    # (len(settings), len(df)).
+    weights = np.array([[s["weights"][k] for k in WEIGHT_TABLE] for s in settings], dtype=np.float64)
+    w = dict(zip(WEIGHT_TABLE, weights.T[:, :, None]))
+    max_fail = np.array([s["max_fail"] for s in settings], dtype=np.float64)[:, None]
+    K        = np.array([s["step_K"] for s in settings], dtype=np.float64)[:, None]
+    bonus    = np.array([s["bonus_ratio"] for s in settings], dtype=np.float64)[:, None]
+
+    # Older results have no gt_elements; their error ratio is recovered from
+    # the stored design score, which was computed with max_fail = 1.
+    stored_ratio = (1.0 / df["design_score"].to_numpy(np.float64) - 1.0) / 2.0
+    if "gt_elements" in df:
+        n_elements = df["gt_elements"].to_numpy(np.float64)
+        design_ratio = np.where(np.isnan(n_elements), stored_ratio,
+                                df["design_errs"].to_numpy(np.float64) / np.maximum(np.nan_to_num(n_elements), 1.0))
+    else:
+        design_ratio = stored_ratio
+
+    design_score = 1.0 / (1.0 + 2 * design_ratio[None, :] / max_fail)
+    blank_score  = 1.0 / (1.0 + 2 * df["blank_ratio"].to_numpy(np.float64)[None, :] / max_fail)
+
+    final_raw = (
+        w["precision"] * df["precision"].to_numpy(np.float64) +
+        w["recall"]    * df["recall"].to_numpy(np.float64)    +
+        w["design"]    * design_score                          +
+        w["blank"]     * blank_score                           +
+        w["read"]      * df["readability"].to_numpy(np.float64) +
+        w["align"]     * df["align"].to_numpy(np.float64)
+    )
+
+    # Same formula as adjust_with_steps, broadcast over settings x PDFs.
+    steps   = df["step"].to_numpy(np.float64)[None, :]
+    sat     = steps / (steps + K)
+    score_p = final_raw * (1.0 - (1.0 - final_raw) * sat)
+    final   = np.clip(score_p + bonus * final_raw * (1.0 - sat), 0.0, 1.0)
+    return final_raw, final
+
+def rescore_results(results_dir: Path, settings: List[Dict]) -> Path:
+
+    t0 = time.perf_counter()
+    df = load_score_frame(results_dir)
+    if df.empty:
+        raise FileNotFoundError(f"No *_score.json files found under {results_dir}")
+    settings = [resolve_rescore_setting(s) for s in settings]
+    final_raw, final = rescore_arrays(df, settings)
+
+    columns = {}
+    report = []
+    for i, setting in enumerate(settings):
+        columns[f"final_raw_{i}"] = final_raw[i].round(4)
+        columns[f"final_{i}"]     = final[i].round(4)
+        by_algo = pd.Series(final[i]).groupby(df["algo"].to_numpy()).mean().round(4)
+        report.append({
+            "setting":       i,
+            **setting,
+            "avg_final_raw": round(float(final_raw[i].mean()), 4),
+            "avg_final":     round(float(final[i].mean()), 4),
+            "by_algo":       {algo: float(v) for algo, v in by_algo.items()},
+        })
+
+    table = pd.concat([df[["file", "algo", "split", "step", "final_raw", "final"]].reset_index(drop=True),
+                       pd.DataFrame(columns)], axis=1)
+    summary_dir = results_dir / "summary"
+    ensure_out_dir(summary_dir)
+    table_path = write_results_table(table, summary_dir, RESCORE_TABLE)
+    report_path = summary_dir / f"{RESCORE_TABLE}.json"
+    tmp_path = report_path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps({"results": len(df), "results_table": table_path.name, "settings": report},
+                                   ensure_ascii=False, indent=2), "utf-8")
+    os.replace(tmp_path, report_path)
+
+    best = max(report, key=lambda r: r["avg_final"])
+    print(f"Rescored {len(df)} results with {len(settings)} setting(s) in {time.perf_counter() - t0:.2f}s")
+    print(f"Stored weights: avg_final {round(float(df['final'].mean()), 4)}")
+    print(f"Best setting #{best['setting']}: avg_final {best['avg_final']} "
+          f"(weights {best['weights']}, K {best['step_K']}, bonus {best['bonus_ratio']}, max_fail {best['max_fail']})")
+    print(f"Rescore report written to: {report_path}")
+    return report_path
+
 def main():
     parser = argparse.ArgumentParser(
         description=(
             "Script for Evaluating Scientific Research Drawings\n"
             "• Single file mode: script.py <pdf> <gt.json> [--outdir DIR]\n"
-            "• Batch mode : script.py --pdf_dir DIR --gt_dir DIR [--outdir DIR]"
+            "• Batch mode : script.py --pdf_dir DIR --gt_dir DIR [--outdir DIR] [--workers N]"
         )
     )
 
@@ -510,9 +2132,107 @@ def main():
  
     parser.add_argument("--outdir", default="eval_output",
                         help="Output directory for intermediate files and score.json / summary.json")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of PDFs evaluated concurrently in batch mode")
+    parser.add_argument("--render_procs", type=int, default=0,
+                        help="Rasterize PDFs in this many processes feeding async judges through a bounded queue "
+                             "(0 = thread-pool mode)")
+    parser.add_argument("--queue_size", type=int, default=8,
+                        help="Maximum number of rendered PDFs waiting for the judge stage")
+    parser.add_argument("--vlm_concurrency", type=int, default=VLM_MAX_CONCURRENCY,
+                        help="Maximum number of model calls in flight at the same time")
+    parser.add_argument("--cache_path", default=None,
+                        help="SQLite file for cached model responses (default: <outdir>/vlm_cache.sqlite)")
+    parser.add_argument("--cache_max_mb", type=float, default=256,
+                        help="Size bound of the response cache; least recently used entries are evicted")
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true",
+                        help="Always query the model and do not read or write the response cache")
+    parser.add_argument("--refresh-cache", dest="refresh_cache", action="store_true",
+                        help="Ignore cached responses but store the fresh ones")
+    parser.add_argument("--keep-artifacts", dest="keep_artifacts", action="store_true",
+                        help="Also write the rendered page and grid PNGs to the output directory")
+    parser.add_argument("--no-resume", dest="no_resume", action="store_true",
+                        help="Re-evaluate every PDF instead of reusing unchanged results from the run manifest")
+    parser.add_argument("--rpm", type=float, default=VLM_RPM,
+                        help="Requests per minute allowed by the judge deployment (0 = unlimited)")
+    parser.add_argument("--tpm", type=float, default=VLM_TPM,
+                        help="Tokens per minute allowed by the judge deployment (0 = unlimited)")
+    parser.add_argument("--max_retries", type=int, default=VLM_MAX_RETRIES,
+                        help="Retries for throttled (429), 5xx or dropped model calls")
+    parser.add_argument("--http_pool_size", type=int, default=HTTP_POOL_SIZE,
+                        help="Keep-alive connections shared by all model calls")
+    parser.add_argument("--http_timeout", type=float, default=HTTP_TIMEOUT,
+                        help="Read/write timeout of a model call in seconds")
+    parser.add_argument("--http_connect_timeout", type=float, default=HTTP_CONNECT_TIMEOUT,
+                        help="Connection timeout of a model call in seconds")
+    parser.add_argument("--text-fallback-words", dest="text_fallback_words", action="store_true",
+                        help="Use PyMuPDF words as PDF labels when the PDF has no structure tree")
+    parser.add_argument("--doc_cache_mb", type=float, default=DOC_CACHE_MB,
+                        help="Memory cap for rendered pages kept in the per-process PDF cache (0 = disable)")
+    parser.add_argument("--blank-metric", dest="blank_metric", choices=["vlm", "local"], default=BLANK_METRIC,
+                        help="Estimate the blank ratio with the judge model or locally from the rendered page")
+    parser.add_argument("--image_format", choices=sorted(IMAGE_MIME), default=IMAGE_FORMAT,
+                        help="Encoding of the images sent to the judge model")
+    parser.add_argument("--image_quality", type=int, default=IMAGE_QUALITY,
+                        help="JPEG/WebP quality of the images sent to the judge model")
+    parser.add_argument("--image_max_edge", type=int, default=IMAGE_MAX_EDGE,
+                        help="Downscale images so that their long edge is at most this many pixels (0 = keep)")
+    parser.add_argument("--timings", action="store_true",
+                        help="Record per-stage wall times in each *_score.json and p50/p95/max in summary.json")
+    parser.add_argument("--profile", type=int, default=0, metavar="N",
+                        help="Dump cProfile stats of the local stages for the N slowest PDFs (implies --timings)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Memory-bounded batch mode: lazy directory scan, results appended to disk as they "
+                             "arrive and only running aggregates kept in memory (no --render_procs)")
+    parser.add_argument("--leaderboard", action="store_true",
+                        help="Only aggregate the existing *_score.json files under --outdir into a leaderboard "
+                             "by algorithm x split x step bucket")
+    parser.add_argument("--step_buckets", default=",".join(map(str, STEP_BUCKETS)),
+                        help="Comma-separated step bucket edges for the leaderboard")
+    parser.add_argument("--rescore", action="store_true",
+                        help="Only recompute final_raw/final of the existing results under --outdir")
+    parser.add_argument("--weights", default=None,
+                        help='Rescore weights as JSON overriding the defaults, e.g. \'{"read": 0.3, "align": 0.05}\'')
+    parser.add_argument("--step_K", type=float, default=STEP_K, help="Rescore step saturation constant")
+    parser.add_argument("--bonus_ratio", type=float, default=STEP_BONUS_RATIO, help="Rescore few-step bonus ratio")
+    parser.add_argument("--max_fail", type=float, default=1.0,
+                        help="Rescore inverse_ratio scale for the design and blank scores")
+    parser.add_argument("--rescore_grid", default=None,
+                        help="JSON file with a list of settings or a dict of value lists to sweep")
     args = parser.parse_args()
     out_dir = Path(args.outdir).expanduser().resolve()
 
+    if args.rescore:
+        if not out_dir.is_dir():
+            sys.exit(f"The outdir does not exist or is not a folder: {out_dir}")
+        if args.rescore_grid:
+            settings = expand_rescore_grid(json.loads(Path(args.rescore_grid).read_text("utf-8")))
+        else:
+            settings = [{"weights": json.loads(args.weights) if args.weights else {},
+                         "step_K": args.step_K, "bonus_ratio": args.bonus_ratio, "max_fail": args.max_fail}]
+        try:
+            rescore_results(out_dir, settings)
+        except (FileNotFoundError, ValueError) as e:
+            sys.exit(str(e))
+        return
+
+    if args.leaderboard:
+        if not out_dir.is_dir():
+            sys.exit(f"The outdir does not exist or is not a folder: {out_dir}")
+        write_leaderboard(out_dir, sorted(int(e) for e in args.step_buckets.split(",")))
+        return
+    set_vlm_concurrency(args.vlm_concurrency)
+    configure_image_encoding(args.image_format, args.image_quality, args.image_max_edge)
+    set_blank_metric(args.blank_metric)
+    set_text_fallback_words(args.text_fallback_words)
+    set_stage_timings(args.timings or args.profile > 0)
+    configure_doc_cache(args.doc_cache_mb)
+    configure_http_pool(args.http_pool_size, args.http_timeout, args.http_connect_timeout)
+    configure_rate_limits(args.rpm, args.tpm, args.max_retries)
+    if not args.no_cache:
+        cache_path = Path(args.cache_path).expanduser().resolve() if args.cache_path else out_dir / "vlm_cache.sqlite"
+        configure_response_cache(cache_path, args.cache_max_mb, refresh=args.refresh_cache)
+
     if args.pdf_dir and args.gt_dir:
         pdf_dir = Path(args.pdf_dir).expanduser().resolve()
         gt_dir  = Path(args.gt_dir).expanduser().resolve()
@@ -522,7 +2242,17 @@ def main():
         if not gt_dir.exists() or not gt_dir.is_dir():
             sys.exit(f"The gt_dir does not exist or is not a folder: {gt_dir}")
 
-        evaluate_batch(pdf_dir, gt_dir, out_dir)
+        if args.stream:
+            if args.render_procs > 0:
+                print("--stream evaluates PDFs in a bounded thread pool; --render_procs is ignored")
+            evaluate_batch_stream(pdf_dir, gt_dir, out_dir, workers=args.workers,
+                                  resume=not args.no_resume, keep_artifacts=args.keep_artifacts,
+                                  profile_top=args.profile)
+            return
+        evaluate_batch(pdf_dir, gt_dir, out_dir, workers=args.workers,
+                       resume=not args.no_resume, keep_artifacts=args.keep_artifacts,
+                       render_procs=args.render_procs, queue_size=args.queue_size,
+                       profile_top=args.profile)
         return  
 
     if not (args.pdf and args.gt_prompt):
@@ -537,9 +2267,12 @@ def main():
     if not gt_prompt_path.exists():
         sys.exit(f"NO GT prompt : {gt_prompt_path}")
 
-    score_json = evaluate_single_pdf(pdf_path, gt_prompt_path, out_dir)
+    score_json = evaluate_single_pdf(pdf_path, gt_prompt_path, out_dir, args.keep_artifacts)
     print("\n================== Evaluation completed ==================")
     print(score_json.read_text("utf-8"))
+    if args.profile > 0:
+        profile_pdfs([pdf_path], out_dir / "profiles")
+        print(f"cProfile stats written to {out_dir / 'profiles'}")
     print(f"\nAll files have been output to {out_dir}")
 
 
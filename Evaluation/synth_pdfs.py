@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic tagged PDFs for scale-testing evaluation_code.py
+"""
+
+import argparse
+import io
+import json
+import math
+import random
+import re
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import fitz
+import pikepdf
+from pikepdf import Array, Dictionary, Name, String
+
+from evaluation_code import FILE_PAT
+
+CELL_W, CELL_H = 140.0, 56.0         # points per shape slot
+MAX_PAGE_EDGE = 2384.0                # A1; larger diagrams get smaller shapes instead
+SHAPES_PER_SHEET = 32                 # shapes grouped under one "Sheet.N" node
+GT_NAME_PAT = re.compile(r"^t(?:i)?2i_\d+$", re.I)
+
+
+def scale_labels(labels: List[str], n_elements: Optional[int]) -> List[str]:
+
+    # Cycle through the GT labels; repeats get a suffix so they stay distinct shapes.
+    if not n_elements or n_elements <= len(labels) or not labels:
+        return list(labels)
+    out = list(labels)
+    for i in range(len(labels), n_elements):
+        out.append(f"{labels[i % len(labels)]} {i // len(labels) + 1}")
+    return out
+
+
+def layout_boxes(n: int, width: float, height: float,
+                 rng: random.Random) -> List[fitz.Rect]:
+
+    cols = max(1, math.ceil(math.sqrt(n * width / height * CELL_H / CELL_W)))
+    rows = max(1, math.ceil(n / cols))
+    cell_w, cell_h = width / cols, height / rows
+    boxes = []
+    for i in range(n):
+        x, y = (i % cols) * cell_w, (i // cols) * cell_h
+        # Small deterministic offsets so algorithms/steps do not render identically.
+        dx, dy = rng.uniform(0, 0.1) * cell_w, rng.uniform(0, 0.1) * cell_h
+        boxes.append(fitz.Rect(x + cell_w * 0.05 + dx, y + cell_h * 0.05 + dy,
+                               x + cell_w * 0.85 + dx, y + cell_h * 0.85 + dy))
+    return boxes
+
+
+def _shape_node(pdf: pikepdf.Pdf, label: str, page, use_actual_text: bool) -> Dictionary:
+
+    node = Dictionary(Type=Name.StructElem, S=Name.Figure, Pg=page)
+    if use_actual_text:
+        node.A = Dictionary(O=Name.Layout, ActualText=String(label))
+    else:
+        node.Alt = String(label)
+    return pdf.make_indirect(node)
+
+
+def make_tagged_pdf(pdf_path: Path, labels: List[str],
+                    page_size: Optional[Tuple[float, float]] = None,
+                    seed: str = "") -> Path:
+    """
+    Write a one-page PDF with a box and its text for every label, plus a
+    structure tree shaped like Visio's: Document > Part ("页-1") > Sect
+    ("Sheet.N") > Figure, where shapes carry the label either in /Alt or in
+    /A /ActualText. The page and sheet nodes are the ones
+    pdf_extract_text filters out.
+    """
+    rng = random.Random(seed or pdf_path.name)
+    if page_size is None:
+        # Landscape 4:3 page that grows with the element count up to MAX_PAGE_EDGE.
+        cols = max(1, math.ceil(math.sqrt(len(labels) * 4 / 3 * CELL_H / CELL_W)))
+        rows = max(1, math.ceil(len(labels) / cols))
+        width, height = cols * CELL_W, rows * CELL_H
+        shrink = min(1.0, MAX_PAGE_EDGE / max(width, height))
+        page_size = (width * shrink, height * shrink)
+    width, height = page_size
+
+    doc = fitz.open()
+    page = doc.new_page(width=width, height=height)
+    boxes = layout_boxes(len(labels), width, height, rng)
+    shape = page.new_shape()
+    for rect in boxes:
+        shape.draw_rect(rect)
+    shape.finish(color=(0, 0, 0), fill=(0.93, 0.95, 1.0), width=0.6)
+    # All text goes into the same Shape: page.insert_text would commit (and
+    # rescan the content stream) once per label, which is quadratic.
+    for rect, label in zip(boxes, labels):
+        fontsize = max(2.0, min(10.0, rect.height * 0.35, rect.width * 1.6 / max(len(label), 1)))
+        shape.insert_text((rect.x0 + 2, rect.y0 + rect.height / 2 + fontsize / 3), label, fontsize=fontsize)
+    shape.commit()
+    data = doc.tobytes()
+    doc.close()
+
+    with pikepdf.open(io.BytesIO(data)) as pdf:
+        pg = pdf.pages[0].obj
+        sheets = Array()
+        for start in range(0, len(labels), SHAPES_PER_SHEET):
+            kids = Array([_shape_node(pdf, label, pg, use_actual_text=(start + i) % 2 == 1)
+                          for i, label in enumerate(labels[start:start + SHAPES_PER_SHEET])])
+            sheets.append(pdf.make_indirect(Dictionary(
+                Type=Name.StructElem, S=Name.Sect, Pg=pg,
+                Alt=String(f"Sheet.{start // SHAPES_PER_SHEET + 1}"), K=kids)))
+        part = pdf.make_indirect(Dictionary(Type=Name.StructElem, S=Name.Part, Pg=pg,
+                                            Alt=String("页-1"), K=sheets))
+        document = pdf.make_indirect(Dictionary(Type=Name.StructElem, S=Name.Document, K=Array([part])))
+        pdf.Root.StructTreeRoot = pdf.make_indirect(Dictionary(Type=Name.StructTreeRoot, K=document))
+        pdf.Root.MarkInfo = Dictionary(Marked=True)
+        pdf.save(pdf_path)
+    return pdf_path
+
+
+def generate_from_gt(gt_path: Path, out_dir: Path,
+                     algos: List[str], steps: List[int],
+                     n_elements: Optional[int] = None,
+                     page_size: Optional[Tuple[float, float]] = None,
+                     gt_out_dir: Optional[Path] = None) -> List[Path]:
+    """
+    Emit <gt stem>_<algo>_step_<k>.pdf for every algorithm and step.
+
+    With n_elements the GT labels are cycled up to that count; pass
+    gt_out_dir to also write the scaled GT so the pair still matches.
+    """
+    if not GT_NAME_PAT.match(gt_path.stem):
+        raise ValueError(f"GT file name must look like t2i_<n>.json or ti2i_<n>.json: {gt_path.name}")
+    labels = scale_labels([obj["label"] for obj in json.loads(gt_path.read_text("utf-8"))], n_elements)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if gt_out_dir is not None:
+        gt_out_dir.mkdir(parents=True, exist_ok=True)
+        (gt_out_dir / gt_path.name).write_text(
+            json.dumps([{"label": l} for l in labels], ensure_ascii=False, indent=2), "utf-8")
+
+    written = []
+    for algo in algos:
+        for step in steps:
+            name = f"{gt_path.stem}_{algo}_step_{step}.pdf"
+            if not FILE_PAT.match(name):
+                raise ValueError(f"Algorithm names must not contain '_': {algo}")
+            written.append(make_tagged_pdf(out_dir / name, labels, page_size, seed=name))
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate tagged PDFs from GT prompt JSON files")
+    parser.add_argument("--gt", nargs="+", required=True,
+                        help="GT JSON files or folders such as GT/prompt-gt-t2i")
+    parser.add_argument("--out", default="result_pdfs", help="output folder for the PDFs")
+    parser.add_argument("--algos", default="synth", help="comma-separated algorithm names")
+    parser.add_argument("--steps", default="10", help="comma-separated step counts")
+    parser.add_argument("--elements", type=int, default=None,
+                        help="scale every diagram up to this many elements")
+    parser.add_argument("--page_size", default=None, help="WIDTHxHEIGHT in points (default: grows with elements)")
+    parser.add_argument("--gt_out", default=None, help="write the (scaled) GT files here")
+    parser.add_argument("--limit", type=int, default=None, help="use at most this many GT files")
+    args = parser.parse_args()
+
+    gt_files: List[Path] = []
+    for item in map(Path, args.gt):
+        gt_files.extend(sorted(f for f in item.glob("*.json") if not f.name.startswith("."))
+                        if item.is_dir() else [item])
+    gt_files = gt_files[:args.limit] if args.limit else gt_files
+
+    size = tuple(float(v) for v in args.page_size.lower().split("x")) if args.page_size else None
+    algos = [a.strip() for a in args.algos.split(",") if a.strip()]
+    steps = [int(s) for s in args.steps.split(",")]
+    gt_out = Path(args.gt_out) if args.gt_out else None
+
+    total = 0
+    for gt_path in gt_files:
+        total += len(generate_from_gt(gt_path, Path(args.out), algos, steps, args.elements, size, gt_out))
+    print(f"Wrote {total} PDFs from {len(gt_files)} GT files to {args.out}")
+
+
+
+# python synth_pdfs.py --gt GT/prompt-gt-t2i --algos algoA,algoB --steps 10,50 --out result_pdfs
+# python synth_pdfs.py --gt GT/prompt-gt-t2i/t2i_1.json --elements 5000 --gt_out /tmp/gt_big --out /tmp/pdf_big
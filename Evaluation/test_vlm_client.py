@@ -0,0 +1,94 @@
+import asyncio
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import evaluation_code as ec
+from benchmark import StubJudge
+
+
+@pytest.fixture
+def stub_judge(monkeypatch):
+
+    with StubJudge(latency=0.0) as judge:
+        monkeypatch.setattr(ec, "AZURE_ENDPOINT", judge.endpoint)
+        monkeypatch.setattr(ec, "AZURE_API_KEY", "stub")
+        monkeypatch.setattr(ec, "AZURE_API_VERSION", "2024-02-01")
+        monkeypatch.setattr(ec, "AZURE_MODEL_NAME", "stub")
+        monkeypatch.setattr(ec, "_RESPONSE_CACHE", None)
+        ec.configure_http_pool(3, 7.0, 2.0)
+        yield judge
+    ec.configure_http_pool()
+
+
+def _http_client(client):
+
+    return client._client
+
+
+def test_client_uses_configured_pool(stub_judge):
+
+    client = ec.get_vlm_client()
+    http = _http_client(client)
+    assert client is ec.get_vlm_client()
+    assert http.timeout.read == 7.0
+    assert http.timeout.connect == 2.0
+    assert http._transport._pool._max_connections == 3
+    assert http._transport._pool._max_keepalive_connections == 3
+    assert client.max_retries == 0
+
+
+def test_configure_http_pool_rebuilds_client(stub_judge):
+
+    before = ec.get_vlm_client()
+    ec.configure_http_pool(5, 30.0, 3.0)
+    after = ec.get_vlm_client()
+    assert after is not before
+    assert _http_client(after)._transport._pool._max_connections == 5
+    assert _http_client(after).timeout.read == 30.0
+
+
+def test_connections_are_reused(stub_judge):
+
+    for _ in range(6):
+        ec.chat_completion([{"role": "user", "content": "List all the text elements"}])
+    assert stub_judge.calls == 6
+    assert len(stub_judge.peers) == 1
+
+
+def test_concurrent_calls_stay_within_pool(stub_judge):
+
+    async def burst():
+        msg = [{"role": "user", "content": "List all the text elements"}]
+        return await asyncio.gather(*(ec.achat_completion(msg) for _ in range(12)))
+
+    replies = ec.run_vlm(burst())
+    assert len(replies) == 12
+    assert 1 <= len(stub_judge.peers) <= 3
+
+
+def test_judges_parse_stub_answers(stub_judge, tmp_path: Path):
+
+    image = np.full((32, 32, 3), 255, dtype=np.uint8)
+    num_errors, analysis = ec.gpt_design_errors(image)
+    assert num_errors == 1
+    assert analysis.startswith("Module 1")
+    assert ec.gpt_blank_ratio(image) == pytest.approx(0.10)
+    labels, out_json = ec.gpt_extract_labels(image, tmp_path, stem="stub")
+    assert labels == ["Input", "Output"]
+    assert out_json.exists()
+
+
+def test_unparseable_reply_is_not_cached(stub_judge, tmp_path: Path):
+
+    ec.configure_response_cache(tmp_path / "cache.sqlite")
+    image = np.full((32, 32, 3), 255, dtype=np.uint8)
+    stub_judge.answers["design"] = "No count here."
+    with pytest.raises(RuntimeError):
+        ec.gpt_design_errors(image)
+
+    stub_judge.answers["design"] = "Module 1: overlap.\n2"
+    assert ec.gpt_design_errors(image)[0] == 2
+    assert ec.gpt_design_errors(image)[0] == 2
+    assert stub_judge.calls == 2
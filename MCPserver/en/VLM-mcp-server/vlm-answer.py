@@ -1,11 +1,17 @@
 from contextlib import asynccontextmanager
+import asyncio
 from collections.abc import AsyncIterator
 import os
 import base64
-from openai import OpenAI
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from openai import AsyncOpenAI
 from typing import Optional
 from mcp.server.fastmcp import Context, FastMCP
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
 
 
 # Global constant for model name
@@ -18,12 +24,12 @@ MODEL_NAME = "o3"
 # MODEL_NAME = "gemini-2.5-pro"
 # MODEL_NAME = "gpt-5"
 
-client = OpenAI(                                                            
+client = AsyncOpenAI(                                                            
     api_key="k",
     base_url="",
 )
 
-client = AzureOpenAI(
+client = AsyncAzureOpenAI(
     azure_endpoint = "/",
     api_key='',
     api_version=""
@@ -39,8 +45,89 @@ def encode_image(image_path):
         return None
 
 
-# Initialize message list to save conversation history
-messages = []
+# Conversation history per session id. Recently used sessions stay in memory
+# (LRU); set VLM_SESSION_DB to a SQLite file to keep them across restarts.
+MAX_SESSIONS = 32
+MAX_HISTORY = 96  # Keep last 96 messages (approx 48 rounds)
+SESSION_DB = os.environ.get("VLM_SESSION_DB")
+DEFAULT_SESSION = "default"
+
+
+class SessionStore:
+    """LRU of session histories with optional SQLite write-through"""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, db_path: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self._cache = OrderedDict()
+        self._locks = {}  # session id -> [asyncio.Lock, number of calls using it]
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS sessions "
+                             "(id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated REAL NOT NULL)")
+            self._db.commit()
+
+    @asynccontextmanager
+    async def session(self, session_id: str):
+        """Held for a whole round: calls on one session queue up, other sessions run concurrently"""
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and session_id not in self._cache:
+                del self._locks[session_id]
+
+    def get(self, session_id: str) -> list:
+        with self._lock:
+            if session_id not in self._cache:
+                history = []
+                if self._db is not None:
+                    row = self._db.execute("SELECT messages FROM sessions WHERE id = ?",
+                                           (session_id,)).fetchone()
+                    if row:
+                        history = json.loads(row[0])
+                self._remember(session_id, history)
+            self._cache.move_to_end(session_id)
+            return list(self._cache[session_id])
+
+    def put(self, session_id: str, history: list) -> None:
+        history = history[-MAX_HISTORY:]
+        with self._lock:
+            self._remember(session_id, history)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                                 (session_id, json.dumps(history, ensure_ascii=False), time.time()))
+                self._db.commit()
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._remember(session_id, [])
+            if self._db is not None:
+                self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, session_id: str, history: list) -> None:
+        # Evicted sessions are only dropped from memory; SQLite still has them.
+        self._cache[session_id] = history
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.max_sessions:
+            evicted, _ = self._cache.popitem(last=False)
+            entry = self._locks.get(evicted)
+            if entry is not None and entry[1] == 0:
+                del self._locks[evicted]
+
+
+sessions = SessionStore(db_path=SESSION_DB)
 
 # Lifecycle management
 @asynccontextmanager
@@ -49,6 +136,7 @@ async def lifespan(app) -> AsyncIterator[None]:
     try:
         yield
     finally:
+        sessions.close()
         print("Shutting down Chat service...")
 
 # Create FastMCP instance
@@ -56,7 +144,8 @@ mcp = FastMCP("ChatService", dependencies=["openai"], lifespan=lifespan, log_lev
     
 
 @mcp.tool()
-def ask_with_images(ctx: Context, type_m: int, screenshot_image_path: Optional[str] = None, reference_image_path: Optional[str] = None) -> str:
+async def ask_with_images(ctx: Context, type_m: int, screenshot_image_path: Optional[str] = None, reference_image_path: Optional[str] = None,
+                    session_id: str = DEFAULT_SESSION) -> str:
     """
     Generate the next drawing instruction based on a reference image and/or current screenshot.
     
@@ -65,6 +154,7 @@ def ask_with_images(ctx: Context, type_m: int, screenshot_image_path: Optional[s
     - type_m: 1/2 (1 represents initial drawing, 2 represents continuing drawing).
     - screenshot_image_path: Path to the current screen screenshot (Optional).
     - reference_image_path: Path to the reference image (Optional).
+    - session_id: Conversation key; agents drawing concurrently should each pass their own (Optional).
     
     Returns:
     - Drawing instructions generated by the LLM.
@@ -148,85 +238,84 @@ def ask_with_images(ctx: Context, type_m: int, screenshot_image_path: Optional[s
                 f"Maintain the range 400 < x < 2000; 400 < y < 1300. Do not invent info; follow the description strictly. "
                 f"*** Output the above design content in Chinese. ***")
     
-    global messages 
-
-    if str(type_m) == "1":  # Initial drawing detected
-        messages = []  # Clear global history
-        print("Initial drawing detected, message list cleared.")
+    async with sessions.session(session_id):
+        if str(type_m) == "1":  # Initial drawing detected
+            sessions.clear(session_id)  # Clear this session's history
+            print(f"Initial drawing detected, history of session '{session_id}' cleared.")
+        messages = sessions.get(session_id)
     
-    if len(messages) == 0:
-        question = question_1
-    else:
-        question = question_2
+        if len(messages) == 0:
+            question = question_1
+        else:
+            question = question_2
     
-    # Combined problem description
-    full_question = question
-
-    # Add screenshot status
-    if screenshot_image_path:
-        base64_screenshot_image = encode_image(screenshot_image_path)
-        if base64_screenshot_image:
-            full_question += "\n\nCurrent screenshot provided."
+        # Combined problem description
+        full_question = question
+
+        # Add screenshot status
+        if screenshot_image_path:
+            base64_screenshot_image = await asyncio.to_thread(encode_image, screenshot_image_path)
+            if base64_screenshot_image:
+                full_question += "\n\nCurrent screenshot provided."
+            else:
+                full_question += "\n\nScreenshot failed to load."
         else:
-            full_question += "\n\nScreenshot failed to load."
-    else:
-        full_question += "\n\nNo screenshot provided, generating instructions from initial state."
-
-    # Add reference image status
-    if reference_image_path:
-        base64_reference_image = encode_image(reference_image_path)
-        if base64_reference_image:
-            full_question += "\n\nReference image provided."
+            full_question += "\n\nNo screenshot provided, generating instructions from initial state."
+
+        # Add reference image status
+        if reference_image_path:
+            base64_reference_image = await asyncio.to_thread(encode_image, reference_image_path)
+            if base64_reference_image:
+                full_question += "\n\nReference image provided."
+            else:
+                full_question += "\n\nReference image failed to load."
         else:
-            full_question += "\n\nReference image failed to load."
-    else:
-        full_question += "\n\nNo reference image provided, free design mode active."
-
-    # Build message content
-    content = [{"type": "text", "text": full_question}]
-
-    if screenshot_image_path and base64_screenshot_image:
-        content.append({
-            "type": "image_url", 
-            "image_url": {
-                "url": f"data:image/jpeg;base64,{base64_screenshot_image}",
-                "alt_text": "Current Drawing Progress"
-            }
-        })
-
-    if reference_image_path and base64_reference_image:
-        content.append({
-            "type": "image_url", 
-            "image_url": {
-                "url": f"data:image/jpeg;base64,{base64_reference_image}",
-                "alt_text": "Reference Image (Target Effect)"
-            }
-        })
-
-    # Send request
-    user_message = {"role": "user", "content": content}
+            full_question += "\n\nNo reference image provided, free design mode active."
+
+        # Build message content
+        content = [{"type": "text", "text": full_question}]
+
+        if screenshot_image_path and base64_screenshot_image:
+            content.append({
+                "type": "image_url", 
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64_screenshot_image}",
+                    "alt_text": "Current Drawing Progress"
+                }
+            })
+
+        if reference_image_path and base64_reference_image:
+            content.append({
+                "type": "image_url", 
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64_reference_image}",
+                    "alt_text": "Reference Image (Target Effect)"
+                }
+            })
+
+        # Send request
+        user_message = {"role": "user", "content": content}
     
-    try:
-        completion = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=messages + [user_message]
-        )
-        assistant_reply = completion.choices[0].message.content
+        try:
+            completion = await client.chat.completions.create(
+                model=MODEL_NAME,
+                messages=messages + [user_message]
+            )
+            assistant_reply = completion.choices[0].message.content
 
-        # Extract only text for history (to save tokens/limit)
-        text_only_user_content = [item for item in content if item["type"] == "text"]
+            # Extract only text for history (to save tokens/limit)
+            text_only_user_content = [item for item in content if item["type"] == "text"]
 
-        # Append history
-        messages.append({"role": "user", "content": text_only_user_content})
-        messages.append({"role": "assistant", "content": [{"type": "text", "text": assistant_reply}]})
+            # Append history
+            messages.append({"role": "user", "content": text_only_user_content})
+            messages.append({"role": "assistant", "content": [{"type": "text", "text": assistant_reply}]})
 
-        # Keep last 96 messages (approx 48 rounds)
-        if len(messages) > 96:
-            messages = messages[-96:]
+            sessions.put(session_id, messages)
+
+            return assistant_reply
+        except Exception as e:
+            return f"Request Error: {str(e)}"
 
-        return assistant_reply
-    except Exception as e:
-        return f"Request Error: {str(e)}"
 
 if __name__ == "__main__":
     mcp.run(transport='stdio')
\ No newline at end of file
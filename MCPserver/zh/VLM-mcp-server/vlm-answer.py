@@ -1,11 +1,17 @@
 from contextlib import asynccontextmanager
+import asyncio
 from collections.abc import AsyncIterator
 import os
 import base64
-from openai import OpenAI
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from openai import AsyncOpenAI
 from typing import Optional
 from mcp.server.fastmcp import Context, FastMCP
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
 
 
 # 模型名称全局常量
@@ -18,12 +24,12 @@ MODEL_NAME = "o3"
 # MODEL_NAME = "gemini-2.5-pro"
 # MODEL_NAME = "gpt-5"
 
-client = OpenAI(                                                            
+client = AsyncOpenAI(                                                            
     api_key="k",
     base_url="",
 )
 
-client = AzureOpenAI(
+client = AsyncAzureOpenAI(
     azure_endpoint = "/",
     api_key='',
     api_version=""
@@ -39,8 +45,89 @@ def encode_image(image_path):
         return None
 
 
-# 初始化消息列表, 用于保存历史对话
-messages = []
+# 按会话 id 保存历史对话。最近使用的会话保留在内存中(LRU);
+# 设置 VLM_SESSION_DB 为 SQLite 文件路径可在重启后保留历史
+MAX_SESSIONS = 32
+MAX_HISTORY = 96  # 保留最近96条消息(约48轮对话)
+SESSION_DB = os.environ.get("VLM_SESSION_DB")
+DEFAULT_SESSION = "default"
+
+
+class SessionStore:
+    """会话历史的LRU缓存, 可选写入SQLite"""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, db_path: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self._cache = OrderedDict()
+        self._locks = {}  # session id -> [asyncio.Lock, number of calls using it]
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS sessions "
+                             "(id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated REAL NOT NULL)")
+            self._db.commit()
+
+    @asynccontextmanager
+    async def session(self, session_id: str):
+        """整轮对话期间持有, 同一会话的并发调用依次执行, 不同会话互不阻塞"""
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and session_id not in self._cache:
+                del self._locks[session_id]
+
+    def get(self, session_id: str) -> list:
+        with self._lock:
+            if session_id not in self._cache:
+                history = []
+                if self._db is not None:
+                    row = self._db.execute("SELECT messages FROM sessions WHERE id = ?",
+                                           (session_id,)).fetchone()
+                    if row:
+                        history = json.loads(row[0])
+                self._remember(session_id, history)
+            self._cache.move_to_end(session_id)
+            return list(self._cache[session_id])
+
+    def put(self, session_id: str, history: list) -> None:
+        history = history[-MAX_HISTORY:]
+        with self._lock:
+            self._remember(session_id, history)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                                 (session_id, json.dumps(history, ensure_ascii=False), time.time()))
+                self._db.commit()
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._remember(session_id, [])
+            if self._db is not None:
+                self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, session_id: str, history: list) -> None:
+        # 被淘汰的会话只从内存移除, SQLite 中仍然保留
+        self._cache[session_id] = history
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.max_sessions:
+            evicted, _ = self._cache.popitem(last=False)
+            entry = self._locks.get(evicted)
+            if entry is not None and entry[1] == 0:
+                del self._locks[evicted]
+
+
+sessions = SessionStore(db_path=SESSION_DB)
 
 # 生命周期管理
 @asynccontextmanager
@@ -49,6 +136,7 @@ async def lifespan(app) -> AsyncIterator[None]:
     try:
         yield
     finally:
+        sessions.close()
         print("Shutting down Chat service...")
 
 # 创建 FastMCP 实例
@@ -56,7 +144,8 @@ mcp = FastMCP("ChatService", dependencies=["openai"], lifespan=lifespan, log_lev
     
 
 @mcp.tool()
-def ask_with_images(ctx: Context, type_m:int ,screenshot_image_path: Optional[str] = None, reference_image_path: Optional[str] = None) -> str:
+async def ask_with_images(ctx: Context, type_m:int ,screenshot_image_path: Optional[str] = None, reference_image_path: Optional[str] = None,
+                    session_id: str = DEFAULT_SESSION) -> str:
     """
     根据参考图像和/或当前屏幕截图生成下一步绘图指令(有参考图像输入模式, 屏幕截图不是参考图)。
     
@@ -65,6 +154,7 @@ def ask_with_images(ctx: Context, type_m:int ,screenshot_image_path: Optional[st
     - type_m: 1/2  1代表初次绘制, 2代表继续绘制。    
     - screenshot_image_path: 当前屏幕截图路径(可选)
     - reference_image_path: 参考图像路径(可选)
+    - session_id: 会话标识, 多个智能体同时绘制时各自传入不同的值(可选)
     
     返回:
     - 大模型生成的绘图指令
@@ -160,101 +250,99 @@ def ask_with_images(ctx: Context, type_m:int ,screenshot_image_path: Optional[st
                 f"你所有的设计必须严格按照我给你的描述来, 不能有任何多余或者虚构的信息，文本描述是什么内容，你就只能设计什么内容。"
                 f"***使用中文输出上述设计内容***")
     
-    global messages 
-
-    if str(type_m) == "1":  # 1代表初次绘制
-        messages = []  # 清空全局变量
-        print("检测到初次绘制，已清空消息列表")
+    async with sessions.session(session_id):
+        if str(type_m) == "1":  # 1代表初次绘制
+            sessions.clear(session_id)  # 清空当前会话的历史
+            print(f"检测到初次绘制，已清空会话 {session_id} 的消息列表")
+        messages = sessions.get(session_id)
     
-    if len(messages) == 0:
-        question = question_1
-        # test_suffix = f"{MODEL_NAME}测试_1"
-    else:
-        question = question_2
-        # test_suffix = f"{MODEL_NAME}测试_2"
+        if len(messages) == 0:
+            question = question_1
+            # test_suffix = f"{MODEL_NAME}测试_1"
+        else:
+            question = question_2
+            # test_suffix = f"{MODEL_NAME}测试_2"
     
-    question_test = "对比这两张图片的内容" 
+        question_test = "对比这两张图片的内容" 
 
-    # 构建完整的问题描述（合并 question 和图像状态信息）
-    full_question = question
+        # 构建完整的问题描述（合并 question 和图像状态信息）
+        full_question = question
 
-    # 添加屏幕截图状态
-    if screenshot_image_path:
-        base64_screenshot_image = encode_image(screenshot_image_path)
-        if base64_screenshot_image:
-            full_question += "\n\n当前屏幕截图已提供"
+        # 添加屏幕截图状态
+        if screenshot_image_path:
+            base64_screenshot_image = await asyncio.to_thread(encode_image, screenshot_image_path)
+            if base64_screenshot_image:
+                full_question += "\n\n当前屏幕截图已提供"
+            else:
+                full_question += "\n\n屏幕截图无法加载"
         else:
-            full_question += "\n\n屏幕截图无法加载"
-    else:
-        full_question += "\n\n无当前屏幕截图, 基于初始状态生成指令"
-
-    # 添加参考图像状态
-    if reference_image_path:
-        base64_reference_image = encode_image(reference_image_path)
-        if base64_reference_image:
-            full_question += "\n\n参考图像已提供"
+            full_question += "\n\n无当前屏幕截图, 基于初始状态生成指令"
+
+        # 添加参考图像状态
+        if reference_image_path:
+            base64_reference_image = await asyncio.to_thread(encode_image, reference_image_path)
+            if base64_reference_image:
+                full_question += "\n\n参考图像已提供"
+            else:
+                full_question += "\n\n参考图像无法加载"
         else:
-            full_question += "\n\n参考图像无法加载"
-    else:
-        full_question += "\n\n当前无参考图像, 处于自由设计模式"
-
-    # 使用完整的问题描述构建消息内容
-    content = [{"type": "text", "text": full_question}]
-
-    # 添加图像数据（保持原有逻辑不变）
-    if screenshot_image_path and base64_screenshot_image:
-        content.append({
-            "type": "image_url", 
-            "image_url": {
-                "url": f"data:image/jpeg;base64,{base64_screenshot_image}",
-                "alt_text": "当前绘制进度"
-            }
-        })
-
-    if reference_image_path and base64_reference_image:
-        content.append({
-            "type": "image_url", 
-            "image_url": {
-                "url": f"data:image/jpeg;base64,{base64_reference_image}",
-                "alt_text": "参考图像（目标效果）"
-            }
-        })
+            full_question += "\n\n当前无参考图像, 处于自由设计模式"
+
+        # 使用完整的问题描述构建消息内容
+        content = [{"type": "text", "text": full_question}]
+
+        # 添加图像数据（保持原有逻辑不变）
+        if screenshot_image_path and base64_screenshot_image:
+            content.append({
+                "type": "image_url", 
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64_screenshot_image}",
+                    "alt_text": "当前绘制进度"
+                }
+            })
+
+        if reference_image_path and base64_reference_image:
+            content.append({
+                "type": "image_url", 
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64_reference_image}",
+                    "alt_text": "参考图像（目标效果）"
+                }
+            })
 
     
-    # 发送请求
-    user_message = {"role": "user", "content": content}
-    # messages.append(user_message)
+        # 发送请求
+        user_message = {"role": "user", "content": content}
+        # messages.append(user_message)
     
-    try:
-        completion = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=messages+[user_message]
-        )
-        assistant_reply = completion.choices[0].message.content
-        # assistant_reply+= test_suffix
-
-        # 提取用户消息中的文本内容（不包含图像）
-        text_only_user_content = []
-        for item in content:
-            if item["type"] == "text":
-                text_only_user_content.append(item)
-
-        # messages.append({"role": "assistant", "content": [{"type": "text", "text": assistant_reply}]})
-
-        # 添加不含图像的用户消息到历史记录
-        messages.append({"role": "user", "content": text_only_user_content})
+        try:
+            completion = await client.chat.completions.create(
+                model=MODEL_NAME,
+                messages=messages+[user_message]
+            )
+            assistant_reply = completion.choices[0].message.content
+            # assistant_reply+= test_suffix
+
+            # 提取用户消息中的文本内容（不包含图像）
+            text_only_user_content = []
+            for item in content:
+                if item["type"] == "text":
+                    text_only_user_content.append(item)
+
+            # messages.append({"role": "assistant", "content": [{"type": "text", "text": assistant_reply}]})
+
+            # 添加不含图像的用户消息到历史记录
+            messages.append({"role": "user", "content": text_only_user_content})
         
-        # 添加助手回复到历史记录
-        messages.append({"role": "assistant", "content": [{"type": "text", "text": assistant_reply}]})
+            # 添加助手回复到历史记录
+            messages.append({"role": "assistant", "content": [{"type": "text", "text": assistant_reply}]})
 
-        # 仅保留最近的3次对话（6条消息，因为一次对话包含user和assistant两条消息）
-        if len(messages) > 96:
-            messages = messages[-96:]
+            # 写回会话存储(仅保留最近 MAX_HISTORY 条消息)
+            sessions.put(session_id, messages)
+            return assistant_reply
+        except Exception as e:
+            return f"请求出错:{str(e)}"
 
-        messages_len=len(messages)
-        return assistant_reply
-    except Exception as e:
-        return f"请求出错:{str(e)}"
 
 if __name__ == "__main__":
     mcp.run(transport='stdio')